@@ -1,15 +1,77 @@
 import base64
+import binascii
+import re
+import tempfile
 
+from django.conf import settings
+from django.core.files import File
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+
+from services import images
+
+# Кол-во символов base64, декодируемых за раз; кратно 4.
+DECODE_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s+')
+
+
+def decode_base64(data: str, max_size: int):
+    """
+    Декодирует base64 по частям во временный файл, прерываясь, как только
+    размер превысит max_size. Возвращает файл или None при превышении.
+    Пробелы и переносы строк, которые вставляют многие кодировщики,
+    пропускаются.
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=DECODE_CHUNK_SIZE)
+    size = 0
+    rest = ''
+    for start in range(0, len(data), DECODE_CHUNK_SIZE):
+        chunk = rest + WHITESPACE.sub(
+            '', data[start:start + DECODE_CHUNK_SIZE])
+        # Декодируются только полные группы из 4 символов.
+        end = len(chunk) // 4 * 4
+        chunk, rest = chunk[:end], chunk[end:]
+        chunk = base64.b64decode(chunk, validate=True)
+        size += len(chunk)
+        if size > max_size:
+            file.close()
+            return None
+        file.write(chunk)
+    if rest:
+        file.close()
+        raise binascii.Error('Incorrect padding')
+    file.seek(0)
+    return file
 
 
 class Base64ImageField(serializers.ImageField):
-    """Перевод картинки из base64 в нормальный формат."""
+    """
+    Перевод картинки из base64 в нормальный формат. Принимает и файл,
+    загруженный частью multipart-запроса.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть закодирована в base64.',
+        'too_large': 'Размер картинки не должен превышать {max_size} байт.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            format, _, imgstr = data.partition(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            max_size = settings.RECIPE_IMAGE_MAX_SIZE
+            try:
+                content = decode_base64(imgstr, max_size)
+            except binascii.Error:
+                self.fail('invalid_base64')
+            if content is None:
+                self.fail('too_large', max_size=max_size)
+            data = File(content, name='temp.' + ext)
+        elif getattr(data, 'size', 0) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
 
         return super().to_internal_value(data)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Уменьшенные копии картинки со ссылками на файлы."""
+    def to_representation(self, value):
+        return images.get_urls(value, self.context.get('request'))
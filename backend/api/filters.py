@@ -1,6 +1,7 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters import FilterSet, filters
 
-from services import tag
+from services import search, tag
 from food.models import Ingredient, Recipe
 
 
@@ -27,16 +28,55 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart',
         choices=STATUS_CHOICES)
 
+    TAGS_MATCH_CHOICES = (
+        ('any', 'any'),
+        ('all', 'all')
+    )
+
     tags = filters.ModelMultipleChoiceFilter(
         queryset=tag.get_all_tags(),
         field_name='tags__slug',
-        to_field_name='slug'
+        to_field_name='slug',
+        method='filter_tags'
     )
+    tags_match = filters.ChoiceFilter(
+        method='filter_tags_match',
+        choices=TAGS_MATCH_CHOICES)
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author', 'is_favorited')
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтрует по маске тэгов рецепта без соединения с таблицей
+        связей, поэтому каждый рецепт попадает в выдачу один раз.
+        С tags_match=all нужны все тэги, иначе - любой из них.
+        Подходящие маски перечисляются списком для индекса по маске,
+        а если их слишком много, маска проверяется побитовым И.
+        """
+        if not value:
+            return queryset
+        match_all = self.form.cleaned_data.get('tags_match') == 'all'
+        mask = tag.get_mask(tag_object.id for tag_object in value)
+        if mask is None:
+            return self._filter_tags_by_relations(queryset, value, match_all)
+        masks = tag.get_matching_masks(mask, match_all)
+        if masks is not None:
+            return queryset.filter(tags_mask__in=masks)
+        queryset = queryset.alias(tags_bits=F('tags_mask').bitand(mask))
+        if match_all:
+            return queryset.filter(tags_bits=mask)
+        return queryset.filter(tags_bits__gt=0)
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию рецепта."""
+        return search.search(queryset, value)
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorite__user=self.request.user)
@@ -46,3 +86,14 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shoppingcart__user=self.request.user)
         return queryset
+
+    def _filter_tags_by_relations(self, queryset, tags, match_all):
+        """Фильтрует по тэгам, не помещающимся в маску, через EXISTS."""
+        relations = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'))
+        if not match_all:
+            return queryset.filter(Exists(relations.filter(tag__in=tags)))
+        for tag_object in tags:
+            queryset = queryset.filter(
+                Exists(relations.filter(tag=tag_object)))
+        return queryset
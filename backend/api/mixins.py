@@ -0,0 +1,162 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.functional import cached_property
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from services import cache as gen
+from services.autocomplete import ingredient_index
+
+
+def accepts_gzip(request) -> bool:
+    """Проверяет, принимает ли клиент ответ, сжатый gzip."""
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def get_canonical_query(request) -> str:
+    """Возвращает строку запроса с упорядоченными параметрами."""
+    params = request.query_params
+    return '&'.join(f'{name}={value}'
+                    for name in sorted(params)
+                    for value in sorted(params.getlist(name)))
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 на условные запросы list и retrieve до запуска
+    сериализаторов. ETag и Last-Modified вычисляются по поколениям
+    данных из condition_generations, а при condition_per_user - еще и
+    по поколению избранного, покупок и подписок пользователя.
+    """
+    condition_generations = ()
+    condition_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def get_generations(self, request):
+        """Возвращает поколения данных, от которых зависит ответ."""
+        generations = [gen.get_generation(name)
+                       for name in self.condition_generations]
+        if self.condition_per_user and request.user.is_authenticated:
+            generations.append(
+                gen.get_generation(gen.user_state(request.user.pk)))
+        return generations
+
+    def get_etag(self, request, generations):
+        """
+        Возвращает строгий ETag ответа. Сжатый и несжатый ответы
+        различаются побайтово, поэтому их ETag тоже различаются.
+        """
+        version = ':'.join(map(str, generations))
+        source = f'{request.path}?{get_canonical_query(request)}:{version}'
+        etag = hashlib.md5(source.encode()).hexdigest()
+        if accepts_gzip(request):
+            etag += '-gzip'
+        return quote_etag(etag)
+
+    def _conditional(self, method, request, *args, **kwargs):
+        generations = self.get_generations(request)
+        etag = self.get_etag(request, generations)
+        last_modified = max(generations) // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = method(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Accept-Encoding',))
+            if self.condition_per_user:
+                patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы list и retrieve для анонимных пользователей.
+    Ключ строится по поколению данных, адресу и упорядоченной строке
+    запроса, поэтому после изменения данных старые ответы не выдаются.
+    """
+    anonymous_cache_generation = gen.RECIPES
+
+    def list(self, request, *args, **kwargs):
+        return self._anonymous_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._anonymous_cached(super().retrieve,
+                                      request, *args, **kwargs)
+
+    def get_anonymous_cache_key(self, request):
+        """Возвращает ключ кэша ответа для анонимного пользователя."""
+        generation = gen.get_generation(self.anonymous_cache_generation)
+        return (f'anonymous:{generation}:'
+                f'{request.build_absolute_uri(request.path)}'
+                f'?{get_canonical_query(request)}')
+
+    def _anonymous_cached(self, method, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return method(request, *args, **kwargs)
+        key = self.get_anonymous_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = method(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.ANONYMOUS_CACHE_TIMEOUT)
+        return response
+
+
+class IngredientSearchMixin:
+    """
+    Отвечает на поиск ингредиентов по ?name= из индекса в памяти,
+    не обращаясь к базе данных.
+    """
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return Response(ingredient_index.search(
+            name, settings.INGREDIENT_SEARCH_LIMIT))
+
+
+class CatalogResponse(HttpResponse):
+    """Ответ с предрендеренным справочником."""
+
+    def __init__(self, blob, compressed):
+        super().__init__(blob.gzip if compressed else blob.identity,
+                         content_type='application/json')
+        self.blob = blob
+        self.headers['X-Catalog-Version'] = blob.generation
+        if compressed:
+            self.headers['Content-Encoding'] = 'gzip'
+
+    @cached_property
+    def data(self):
+        """Данные ответа, как у Response из DRF."""
+        return json.loads(self.blob.identity)
+
+
+class CatalogMixin:
+    """
+    Отдает полный список объектов из предрендеренного справочника
+    без обращения к базе данных и сериализаторам.
+    """
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return CatalogResponse(self.catalog.get(), accepts_gzip(request))
@@ -1,5 +1,89 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from services import count as c
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, берущий общее число объектов из кэша."""
+
+    def __init__(self, *args, count_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        count = cache.get(self.count_key)
+        if count is None:
+            count = c.count(self.object_list,
+                            settings.PAGINATION_COUNT_TIMEOUT)
+            cache.set(self.count_key, count,
+                      settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Пагинация по ключу: страница выбирается условием на поля сортировки
+    модели, без COUNT(*) и OFFSET.
+    """
+    page_size_query_param = "limit"
+
+    def get_ordering(self, request, queryset, view):
+        # Ключ страницы строится по полю модели, а сортировку
+        # по аннотации (релевантности поиска) он не сохранит.
+        annotations = queryset.query.annotations
+        if any(isinstance(field, str) and field.lstrip('-') in annotations
+               for field in queryset.query.order_by):
+            raise ValidationError({'cursor': 'Пагинация по ключу '
+                                   'недоступна при такой сортировке, '
+                                   'используйте page.'})
+        return queryset.model._meta.ordering or ('-pk',)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация. С параметром ?cursor= переключается
+    на пагинацию по ключу.
+
+    Если у вьюсета есть метод get_count_signature, общее число объектов
+    кэшируется по возвращаемой им сигнатуре фильтров.
+    """
     page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.count_key = self.get_count_key(view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def django_paginator_class(self, object_list, per_page):
+        return CachedCountPaginator(object_list, per_page,
+                                    count_key=self.count_key)
+
+    def get_count_key(self, view):
+        """Возвращает ключ кэша для числа объектов или None."""
+        get_signature = getattr(view, 'get_count_signature', None)
+        signature = get_signature() if get_signature else None
+        if signature is None:
+            return None
+        signature = json.dumps(signature, sort_keys=True, default=str)
+        return 'count:' + hashlib.md5(signature.encode()).hexdigest()
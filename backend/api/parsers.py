@@ -0,0 +1,37 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+# Часть multipart-запроса с JSON-данными, которые не передать полями формы.
+JSON_PART = 'data'
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    Разбирает multipart/form-data, в котором файлы передаются отдельными
+    частями, а остальные данные (в том числе вложенные тэги
+    и ингредиенты) - JSON-объектом в части data. Файлы больше
+    FILE_UPLOAD_MAX_MEMORY_SIZE Django сбрасывает во временные файлы
+    на диске, не держа их в памяти.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        data = {key: value for key, value in result.data.items()
+                if key != JSON_PART}
+        if JSON_PART in result.data:
+            try:
+                payload = json.loads(result.data[JSON_PART])
+            except ValueError as error:
+                raise ParseError(f'Часть {JSON_PART} должна быть '
+                                 f'JSON-объектом: {error}')
+            if not isinstance(payload, dict):
+                raise ParseError(f'Часть {JSON_PART} должна быть '
+                                 f'JSON-объектом.')
+            data.update(payload)
+        # Файлы добавляются в данные сразу: DRF объединил бы словарь
+        # данных с MultiValueDict файлов списками значений.
+        data.update(result.files.dict())
+        return DataAndFiles(data, MultiValueDict())
@@ -0,0 +1,141 @@
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+TITLE = 'Список покупок'
+COLUMNS = ('Ингредиент', 'Единица измерения', 'Количество')
+CHUNK_SIZE = 64 * 1024
+
+
+def get_row(ingredient):
+    """Возвращает строку списка покупок из агрегированного ингредиента."""
+    return (ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total_amount'])
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок. Метод stream отдает документ
+    частями, не собирая его целиком в памяти.
+    """
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        """Возвращает генератор частей документа в байтах."""
+        for chunk in self.stream_text(ingredients):
+            yield chunk.encode(self.charset)
+
+    def stream_text(self, ingredients):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.stream(data))
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в виде простого текста."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream_text(self, ingredients):
+        yield f'{TITLE}: \n\n'
+        for ingredient in ingredients:
+            name, unit, amount = get_row(ingredient)
+            yield f'- {name} ({unit}) - {amount}\n'
+
+
+class _Line:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream_text(self, ingredients):
+        writer = csv.writer(_Line())
+        yield writer.writerow(COLUMNS)
+        for ingredient in ingredients:
+            yield writer.writerow(get_row(ingredient))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в виде JSON-массива."""
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream_text(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            name, unit, amount = get_row(ingredient)
+            yield separator + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """
+    Список покупок в формате PDF. Таблица ссылок PDF пишется в конце
+    файла, поэтому документ собирается во временный файл, который
+    держится в памяти только до SHOPPING_LIST_PDF_MAX_MEMORY байт,
+    и затем отдается частями.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def get_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT))
+        return self.font_name
+
+    def stream(self, ingredients):
+        with tempfile.SpooledTemporaryFile(
+                settings.SHOPPING_LIST_PDF_MAX_MEMORY) as document:
+            self.draw(document, ingredients)
+            document.seek(0)
+            yield from iter(lambda: document.read(CHUNK_SIZE), b'')
+
+    def draw(self, document, ingredients):
+        font = self.get_font()
+        pdf = canvas.Canvas(document, pagesize=A4, invariant=True)
+        pdf.setTitle(TITLE)
+        width, height = A4
+        top = height - self.margin
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, top, TITLE)
+        y = top - 2 * self.line_height
+        for ingredient in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                y = top
+            name, unit, amount = get_row(ingredient)
+            pdf.setFont(font, self.font_size)
+            pdf.drawString(self.margin, y, f'• {name} ({unit}) — {amount}')
+            y -= self.line_height
+        pdf.save()
+
+
+SHOPPING_LIST_RENDERERS = (TextShoppingListRenderer,
+                           CSVShoppingListRenderer,
+                           JSONShoppingListRenderer,
+                           PDFShoppingListRenderer)
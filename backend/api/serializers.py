@@ -1,22 +1,24 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Manager
 from django.utils.translation import gettext_lazy as _
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
-from food.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
-                         ShoppingCart, Tag)
+from food.models import (Ingredient, IngredientForRecipe, Recipe,
+                         ShoppingCartTotal, Tag)
 from services import favorites as fav
 from services import follow as fol
+from services import images
 from services import ingredient as ingr
-from services import model as m
 from services import recipe as rec
+from services import search
 from services import shopping_cart as sc
 from services import tag as tg
 from users.models import User
 
-from .fields import Base64ImageField
+from .fields import Base64ImageField, ImageVariantsField
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -28,7 +30,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 class IngredientForRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с ингридентами в рецепте."""
-    id = serializers.IntegerField(write_only=True)
+    id = serializers.IntegerField(write_only=True, min_value=1)
 
     class Meta:
         model = IngredientForRecipe
@@ -44,41 +46,64 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с рецептами в отображении подписок."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
-        read_only_fields = ("id", "name", "image", "cooking_time")
-
-    def _validate(self, attrs, model):
-        request = self.context.get('request')
-        recipe: Recipe = self._args[0]
-        value = m.is_exists(request.user, recipe, model)
-
-        if request.method == 'POST':
-            if value:
-                raise serializers.ValidationError({
-                    'errors': 'Рецепт уже добавлен.'})
-        if request.method == 'DELETE':
-            if not value:
-                raise serializers.ValidationError({
-                    'errors': 'Ничего не добавлено.'})
-        return attrs
+        fields = ("id", "name", "image", "image_variants",
+                  "image_placeholder", "cooking_time")
+        read_only_fields = ("id", "name", "image", "image_placeholder",
+                            "cooking_time")
 
 
 class ShoppingCartSerializer(ShortRecipeSerializer):
     """Сериализатор для работы со списком предметов."""
 
-    def validate(self, attrs):
-        """Валидация полей для добавления в список предметов."""
-        return super()._validate(attrs=attrs, model=ShoppingCart)
+
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    """Сериализатор для сумм ингредиентов в списке покупок."""
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ("id", "name", "measurement_unit",
+                  "total_amount", "recipe_count")
 
 
 class FavoriteSerializer(ShortRecipeSerializer):
     """Сериализатор для работы со списком избранных предметов."""
 
-    def validate(self, attrs):
-        """Валидация полей для добавления в избранные."""
-        return super()._validate(attrs=attrs, model=Favorite)
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для массовых операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT)
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка пользователей: подписки текущего пользователя
+    на всех пользователей страницы достаются одним запросом.
+    """
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        pending = [obj for obj in users if not hasattr(obj, 'is_subscribed')]
+        if pending and user is not None and not user.is_anonymous:
+            subscribed = fol.get_subscribed_author_ids(
+                user, [obj.pk for obj in pending])
+        else:
+            subscribed = set()
+        for obj in pending:
+            obj.is_subscribed = obj.pk in subscribed
+        return super().to_representation(users)
 
 
 class CustomUserSerializer(UserSerializer):
@@ -87,6 +112,7 @@ class CustomUserSerializer(UserSerializer):
 
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = (
             'email',
             'id',
@@ -98,6 +124,8 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Получение поля is_subscribed."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -108,9 +136,8 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientForRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=tg.get_all_tags(),
-        many=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1)
     )
     image = Base64ImageField()
 
@@ -124,23 +151,34 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError({
                 'ingredients': 'Необходим хотя бы один ингредиент.'})
-        ingredients_list = []
+        ids = [ingredient['id'] for ingredient in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты не могут повторяться.'})
         for ingredient in value:
-            if ingredient['id'] in ingredients_list:
-                raise serializers.ValidationError({
-                    'ingredients': 'Ингредиенты не могут повторяться.'})
-
             if int(ingredient['amount']) < 1:
                 raise serializers.ValidationError({
                     'amount': 'Кол-во ингредиентов должно быть не меньше 1.'})
-            ingredients_list.append(ingredient['id'])
+        existing = ingr.get_existing_ids(ids)
+        if len(existing) != len(ids):
+            raise serializers.ValidationError([
+                {} if ingredient_id in existing
+                else {'id': [f'Ингредиент {ingredient_id} не найден.']}
+                for ingredient_id in ids
+            ])
         return value
 
     def validate_tags(self, value):
         if not value:
             raise serializers.ValidationError({
                 'tags': "Необходим хотя бы один тэг."})
-        return value
+        existing = tg.get_existing_ids(value)
+        missing = {index: [f'Тэг {tag_id} не найден.']
+                   for index, tag_id in enumerate(value)
+                   if tag_id not in existing}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return list(dict.fromkeys(value))
 
     @transaction.atomic
     def create_ingredients_amounts(self, ingredients, recipe):
@@ -151,29 +189,60 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = rec.create_recipe(validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients_amounts(recipe=recipe,
-                                        ingredients=ingredients)
+        with rec.deferred_documents():
+            recipe = rec.create_recipe(validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients_amounts(recipe=recipe,
+                                            ingredients=ingredients)
+            rec.schedule_documents([recipe.pk])
+        images.schedule_processing(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        Пишет только изменившиеся поля, тэги и ингредиенты. Если рецепт
+        не изменился, выполняются одни чтения: без сохранения, обновления
+        поискового индекса и пересборки представления.
+        """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(recipe=instance,
-                                        ingredients=ingredients)
+        image = validated_data.get('image')
+        if image is not None and images.is_current(instance, image):
+            del validated_data['image']
+        fields = [field for field, value in validated_data.items()
+                  if getattr(instance, field) != value]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
+        if 'image' in fields:
+            instance.image_variants = {}
+            instance.image_placeholder = ''
+            fields += ['image_variants', 'image_placeholder']
+        mask = tg.get_mask(tags)
+        if mask is not None and mask != instance.tags_mask:
+            instance.tags_mask = mask
+            fields.append('tags_mask')
+        with rec.deferred_documents(), sc.deferred_totals():
+            if fields:
+                instance.save(update_fields=fields)
+            tags_changed = rec.set_tags(instance, tags)
+            if tags_changed and mask is None:
+                rec.update_tags_masks([instance.pk])
+            deltas = ingr.update_ingredients_amount(ingredients, instance)
+            if deltas:
+                sc.schedule_totals(instance.pk, deltas)
+            if tags_changed or deltas:
+                rec.schedule_documents([instance.pk])
+        if 'image' in fields:
+            images.schedule_processing(instance)
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
-        return RecipeReadSerializer(instance,
-                                    context=context).data
+        instance = rec.get_recipes_for_read(request.user).get(pk=instance.pk)
+        return RecipeDocumentSerializer(instance,
+                                        context=context).data
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
@@ -183,27 +252,33 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ("id", "tags", "author",
                   "ingredients", "is_favorited", "is_in_shopping_cart", "name",
-                  "image", "text", "cooking_time")
+                  "image", "image_variants", "image_placeholder",
+                  "text", "cooking_time")
         read_only_fields = ("id", "author")
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_subscribed'):
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
         """Получение поля ингридиенты."""
-        recipe = obj
-        ingredients = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredientforrecipe__amount')
-        )
-        return ingredients
+        return [{'id': amount.ingredient.id,
+                 'name': amount.ingredient.name,
+                 'measurement_unit': amount.ingredient.measurement_unit,
+                 'amount': amount.amount}
+                for amount in obj.ingredientforrecipe_set.all()]
 
     def get_is_favorited(self, obj):
         """Получение поля нахождения в избранном."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return fav.is_favorite_exists(obj, user)
@@ -211,12 +286,52 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получение поля нахождения в списке предметов."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return sc.is_shopping_cart_exists(obj, user)
         return False
 
 
+class RecipeDocumentSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор для чтения рецептов из готового представления:
+    к нему добавляются только флаги пользователя.
+    """
+
+    def to_representation(self, instance):
+        document = getattr(instance, 'document', None)
+        if document is None:
+            return RecipeReadSerializer(instance, context=self.context).data
+        data = document.data
+        request = self.context.get('request')
+        image = data['image']
+        if image and request is not None:
+            image = request.build_absolute_uri(image)
+        representation = {
+            'id': data['id'],
+            'tags': data['tags'],
+            'author': {**data['author'],
+                       'is_subscribed': instance.is_subscribed},
+            'ingredients': data['ingredients'],
+            'is_favorited': instance.is_favorited,
+            'is_in_shopping_cart': instance.is_in_shopping_cart,
+            'name': data['name'],
+            'image': image,
+            'image_variants': images.get_urls(
+                data.get('image_variants', {}), request),
+            'image_placeholder': data.get('image_placeholder', ''),
+            'text': data['text'],
+            'cooking_time': data['cooking_time'],
+        }
+        if hasattr(instance, 'search_headline'):
+            representation['search_rank'] = instance.search_rank
+            representation['search_headline'] = search.highlight(
+                instance.search_headline)
+        return representation
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор для создания пользователя."""
     class Meta:
@@ -278,38 +393,27 @@ class FollowSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('email', 'username', 'first_name', 'last_name')
 
-    def validate(self, attrs):
-        """Валидация полей подписок."""
-        request = self.context.get('request')
-        author = self._args[0]
-        follow = fol.follow_exists(request.user, author)
-
-        if request.method == 'POST':
-            if request.user.id == author.id:
-                raise serializers.ValidationError({
-                    'errors': 'Подписка на себя - запрещена.'})
-            if follow:
-                raise serializers.ValidationError({
-                    'errors': 'Вы уже подписаны на данного пользователя.'})
-
-        if request.method == 'DELETE':
-            if not follow:
-                raise serializers.ValidationError({
-                    "errors": "Вы не подписаны."})
-        return attrs
-
     def get_is_subscribed(self, obj):
         """Получение поля is_subscribed."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return fol.follow_exists(user, obj)
 
     def get_recipes(self, obj):
-        """Получение поля рецепта."""
-        recipe = rec.filter_by_author(author=obj)
+        """
+        Получение поля рецепта. Для страницы подписок рецепты всех
+        авторов заранее кладутся в контекст в recipes_by_author.
+        """
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is None:
+            recipes_by_author = rec.get_recipes_by_authors(
+                [obj.pk], self.context.get('recipes_limit'))
         serializer = ShortRecipeSerializer(
-            recipe, context=self.context, many=True)
+            recipes_by_author.get(obj.pk, []), context=self.context,
+            many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
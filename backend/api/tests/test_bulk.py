@@ -0,0 +1,128 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                         ShoppingCart, ShoppingCartTotal)
+from users.models import User
+
+MISSING_ID = 10 ** 6
+
+
+class BulkTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.user)
+        cls.sugar = Ingredient.objects.create(name="сахар",
+                                              measurement_unit="г")
+        cls.recipes = []
+        for number in range(6):
+            recipe = Recipe.objects.create(name=f"recipe_{number}",
+                                           text="text", cooking_time=1,
+                                           author=cls.user)
+            IngredientForRecipe.objects.create(recipe=recipe,
+                                               ingredient=cls.sugar,
+                                               amount=10)
+            cls.recipes.append(recipe)
+        cls.cart_url = reverse("routers:recipes-shopping-cart-summary")
+        cls.favorite_url = reverse("routers:recipes-favorite-bulk")
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _ids(self, count):
+        return [recipe.id for recipe in self.recipes[:count]]
+
+    def test_bulk_requires_auth(self):
+        """Проверяем, что аноним не может менять списки массово."""
+        self.client.credentials()
+        for url in (self.cart_url, self.favorite_url):
+            response = self.client.post(url, {"recipes": self._ids(1)},
+                                        format="json")
+            self.assertEqual(response.status_code,
+                             status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_validation(self):
+        """Проверяем, что пустой или неверный список отклоняется."""
+        for data in ({"recipes": []}, {"recipes": ["abc"]}, {}):
+            response = self.client.post(self.cart_url, data, format="json")
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST,
+                             "Проверьте валидацию списка рецептов.")
+
+    def test_bulk_shopping_cart(self):
+        """Проверяем массовое добавление и удаление из списка покупок."""
+        first, second, third = self._ids(3)
+        ShoppingCart.objects.create(user=self.user, recipe_id=first)
+        response = self.client.post(
+            self.cart_url, {"recipes": [first, second, MISSING_ID, second]},
+            format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], [
+            {"id": first, "status": "already_added"},
+            {"id": second, "status": "added"},
+            {"id": MISSING_ID, "status": "not_found"},
+        ])
+        self.assertEqual(
+            set(ShoppingCart.objects.values_list("recipe_id", flat=True)),
+            {first, second})
+        self.assertEqual(
+            Recipe.objects.get(pk=second).in_carts_count, 1,
+            "Проверьте, что массовое добавление меняет счетчики.")
+        total = ShoppingCartTotal.objects.get(user=self.user)
+        self.assertEqual((total.total_amount, total.recipe_count), (20, 2),
+                         "Проверьте, что массовое добавление меняет " +
+                         "суммы списка покупок.")
+
+        response = self.client.delete(
+            self.cart_url, {"recipes": [first, third]}, format="json")
+        self.assertEqual(response.json()["results"], [
+            {"id": first, "status": "removed"},
+            {"id": third, "status": "not_added"},
+        ])
+        self.assertEqual(
+            list(ShoppingCart.objects.values_list("recipe_id", flat=True)),
+            [second])
+        self.assertEqual(Recipe.objects.get(pk=first).in_carts_count, 0)
+        total = ShoppingCartTotal.objects.get(user=self.user)
+        self.assertEqual((total.total_amount, total.recipe_count), (10, 1))
+
+    def test_bulk_favorite(self):
+        """Проверяем массовое добавление и удаление из избранного."""
+        ids = self._ids(3)
+        response = self.client.post(self.favorite_url, {"recipes": ids},
+                                    format="json")
+        self.assertEqual([result["status"]
+                          for result in response.json()["results"]],
+                         ["added"] * 3)
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+        response = self.client.delete(self.favorite_url, {"recipes": ids},
+                                      format="json")
+        self.assertEqual([result["status"]
+                          for result in response.json()["results"]],
+                         ["removed"] * 3)
+        self.assertFalse(Favorite.objects.exists())
+        self.assertEqual(
+            Recipe.objects.filter(favorites_count__gt=0).count(), 0)
+
+    def test_bulk_query_count(self):
+        """
+        Проверяем, что число запросов не зависит от числа рецептов
+        в запросе.
+        """
+        ids = self._ids(6)
+        for method in ("post", "delete"):
+            request = getattr(self.client, method)
+            with CaptureQueriesContext(connection) as context:
+                request(self.cart_url, {"recipes": ids[:1]}, format="json")
+            with self.assertNumQueries(len(context.captured_queries)):
+                request(self.cart_url, {"recipes": ids[1:]}, format="json")
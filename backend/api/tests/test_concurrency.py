@@ -0,0 +1,96 @@
+import threading
+
+from django.db import connection
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from food.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+THREADS = 8
+
+
+class ConcurrentToggleTest(APITransactionTestCase):
+    """Одновременные одинаковые запросы не приводят к ошибкам 500."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Общая SQLite-база в памяти не ждет снятия '
+                          'блокировок: нужна база в файле или PostgreSQL.')
+        self.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        self.author = User.objects.create_user(
+            email="author@test.com",
+            username="author",
+            password="HelloWorldSecurePassword"
+            )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(name="test_recipe", text="text",
+                                            cooking_time=1,
+                                            author=self.author)
+
+    def _race(self, method, url):
+        """Отправляет THREADS одинаковых запросов одновременно."""
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def worker():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+            barrier.wait()
+            try:
+                response = getattr(client, method)(url)
+                statuses.append(response.status_code)
+            except Exception:
+                statuses.append(status.HTTP_500_INTERNAL_SERVER_ERROR)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def _assert_toggle(self, url, model, created_status):
+        statuses = self._race("post", url)
+        self.assertEqual(
+            statuses,
+            sorted([created_status]
+                   + [status.HTTP_400_BAD_REQUEST] * (THREADS - 1)),
+            "Проверьте, что одновременные добавления создают одну " +
+            "запись, а остальные получают HTTP_400_BAD_REQUEST.")
+        self.assertEqual(model.objects.count(), 1)
+        statuses = self._race("delete", url)
+        self.assertEqual(
+            statuses,
+            sorted([status.HTTP_204_NO_CONTENT]
+                   + [status.HTTP_400_BAD_REQUEST] * (THREADS - 1)),
+            "Проверьте, что одновременные удаления удаляют одну " +
+            "запись, а остальные получают HTTP_400_BAD_REQUEST.")
+        self.assertEqual(model.objects.count(), 0)
+
+    def test_concurrent_favorite(self):
+        url = reverse("routers:recipes-favorite", args=[self.recipe.id])
+        self._assert_toggle(url, Favorite, status.HTTP_201_CREATED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_concurrent_shopping_cart(self):
+        url = reverse("routers:recipes-shopping-cart",
+                      args=[self.recipe.id])
+        self._assert_toggle(url, ShoppingCart, status.HTTP_201_CREATED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_concurrent_subscribe(self):
+        url = reverse("routers:user-subscribe", args=[self.author.id])
+        self._assert_toggle(url, Follow, status.HTTP_201_CREATED)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
@@ -0,0 +1,208 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import Favorite, Ingredient, Recipe, Tag
+from services import cache
+from users.models import User
+
+FILE_CACHE = "django.core.cache.backends.filebased.FileBasedCache"
+SHARED_CACHE = tempfile.mkdtemp()
+
+
+class ConditionalGetTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            first_name="first_test",
+            last_name="last_test",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(
+            user=ConditionalGetTest.user)
+        cls.tag = Tag.objects.create(
+            name="Завтрак",
+            color="#8775fD2",
+            slug="breakfast"
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name="Test",
+            measurement_unit="г"
+        )
+        cls.recipe = Recipe.objects.create(
+            name="test_recipe",
+            text="test_text",
+            cooking_time=1,
+            author=ConditionalGetTest.user
+        )
+
+    def test_catalogs_not_modified(self):
+        """
+        Проверяем, что списки тэгов и ингредиентов отвечают 304
+        на совпавший ETag и отдают новое тело после изменений.
+        """
+        for url, instance in (
+                (reverse("routers:tags-list"), self.tag),
+                (reverse("routers:ingredients-list"), self.ingredient)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response.headers["ETag"]
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_304_NOT_MODIFIED,
+                                 "Проверьте, что при совпадении ETag " +
+                                 "эндпойнт возвращает HTTP_304_NOT_MODIFIED")
+
+                instance.name = instance.name + "_new"
+                with self.captureOnCommitCallbacks(execute=True):
+                    instance.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK,
+                                 "Проверьте, что после изменения данных " +
+                                 "эндпойнт возвращает новое тело.")
+                self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_if_modified_since(self):
+        """Проверяем ответ 304 на заголовок If-Modified-Since."""
+        url = reverse("routers:tags-list")
+        response = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response.headers["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_recipes_etag_depends_on_viewer_state(self):
+        """
+        Проверяем, что ETag списка рецептов авторизованного пользователя
+        меняется при изменении его избранного.
+        """
+        url = reverse("routers:recipes-list")
+        anonymous_etag = self.client.get(url).headers["ETag"]
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+        self.assertNotEqual(etag, anonymous_etag)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         "Проверьте, что ETag учитывает избранное " +
+                         "пользователя.")
+        self.assertTrue(response.data["results"][0]["is_favorited"])
+
+    def test_etag_changes_after_commit(self):
+        """
+        Проверяем, что ETag меняется только после фиксации транзакции:
+        ответ, собранный параллельным запросом по данным до фиксации,
+        не должен попасть в кэш под новым поколением.
+        """
+        # Кэш не откатывается вместе с базой после теста.
+        self.addCleanup(cache.bump_generation, cache.RECIPES)
+        url = reverse("routers:recipes-list")
+        etag = self.client.get(url).headers["ETag"]
+        generation = cache.get_generation(cache.RECIPES)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(pk=self.recipe.pk).delete()
+            self.assertEqual(cache.get_generation(cache.RECIPES), generation,
+                             "Проверьте, что поколение данных не меняется " +
+                             "до фиксации транзакции.")
+        self.assertNotEqual(self.client.get(url).headers["ETag"], etag)
+
+
+class CatalogTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.tag = Tag.objects.create(
+            name="Завтрак",
+            color="#8775fD2",
+            slug="breakfast"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(SHARED_CACHE, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_catalog_is_prerendered(self):
+        """
+        Проверяем, что полный список тэгов отдается без запросов к БД,
+        в том числе сжатым.
+        """
+        url = reverse("routers:tags-list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content)),
+            [{"id": self.tag.id, "name": "Завтрак",
+              "color": "#8775fD2", "slug": "breakfast"}],
+            "Проверьте, что сжатый справочник совпадает с несжатым.")
+
+        identity = self.client.get(url)
+        self.assertNotIn("Content-Encoding", identity.headers)
+        self.assertNotEqual(identity.headers["ETag"], response.headers["ETag"],
+                            "Проверьте, что ETag различается " +
+                            "для сжатого и несжатого ответа.")
+
+    def test_catalog_is_regenerated(self):
+        """Проверяем, что справочник пересобирается после изменений."""
+        url = reverse("routers:tags-list")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Обед", color="#49B64E", slug="lunch")
+        self.assertEqual(
+            [data["slug"] for data in self.client.get(url).json()],
+            ["breakfast", "lunch"])
+
+    @override_settings(CACHES={"default": {"BACKEND": FILE_CACHE,
+                                           "LOCATION": SHARED_CACHE}})
+    def test_generation_from_another_process(self):
+        """
+        Проверяем, что справочник, ETag и поиск ингредиентов
+        обновляются, когда поколение меняет другой процесс
+        (например, manage.py upload_data) через общий кэш.
+        """
+        url = reverse("routers:ingredients-list")
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(self.client.get(url, {"name": "мол"}).data, [])
+        # bulk_create не вызывает сигналов в этом процессе.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name="Молоко", measurement_unit="мл")])
+        subprocess.run(
+            [sys.executable, "manage.py", "shell", "-c",
+             "from services import cache; "
+             "cache.bump_generation(cache.INGREDIENTS)"],
+            cwd=settings.BASE_DIR, check=True,
+            env={**os.environ, "CACHE_BACKEND": FILE_CACHE,
+                 "CACHE_LOCATION": SHARED_CACHE})
+        response = self.client.get(url)
+        self.assertNotEqual(response.headers["ETag"], etag,
+                            "Проверьте, что поколения хранятся в общем " +
+                            "для всех процессов кэше.")
+        self.assertEqual([data["name"] for data in response.json()],
+                         ["Молоко"])
+        self.assertEqual(
+            [data["name"]
+             for data in self.client.get(url, {"name": "мол"}).data],
+            ["Молоко"])
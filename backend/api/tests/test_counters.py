@@ -0,0 +1,112 @@
+import io
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+
+class CountersTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email="author@test.com",
+            username="author",
+            password="HelloWorldSecurePassword"
+            )
+        self.reader = User.objects.create_user(
+            email="reader@test.com",
+            username="reader",
+            password="HelloWorldSecurePassword"
+            )
+        self.recipe = Recipe.objects.create(name="test_recipe", text="text",
+                                            cooking_time=1,
+                                            author=self.author)
+
+    def _assert_counters(self, recipes, followers, favorites, in_carts):
+        """Проверяет счетчики автора и его рецепта."""
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.author.followers_count),
+            (recipes, followers),
+            "Проверьте счетчики рецептов и подписчиков автора.")
+        if favorites is not None:
+            self.recipe.refresh_from_db()
+            self.assertEqual(
+                (self.recipe.favorites_count, self.recipe.in_carts_count),
+                (favorites, in_carts),
+                "Проверьте счетчики избранного и списков покупок рецепта.")
+
+    def test_counters_follow_changes(self):
+        """Проверяем, что счетчики меняются при создании и удалении."""
+        self._assert_counters(1, 0, 0, 0)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Recipe.objects.create(name="second", text="text", cooking_time=1,
+                              author=self.author)
+        self._assert_counters(2, 1, 1, 1)
+        Favorite.objects.filter(user=self.reader).delete()
+        ShoppingCart.objects.filter(user=self.reader).delete()
+        Follow.objects.filter(user=self.reader).delete()
+        self._assert_counters(2, 0, 0, 0)
+
+    def test_counters_follow_cascade_deletes(self):
+        """Проверяем, что счетчики меняются при каскадном удалении."""
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader.delete()
+        self._assert_counters(1, 0, 0, 0)
+        self.recipe.delete()
+        self._assert_counters(0, 0, None, None)
+
+    def test_repair_counters_command(self):
+        """Проверяем, что команда исправляет разошедшиеся счетчики."""
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=7,
+                                                      followers_count=3)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=0,
+                                                        in_carts_count=2)
+        call_command("repair_counters", "--chunk-size", "1",
+                     stdout=io.StringIO())
+        self._assert_counters(1, 0, 1, 0)
+
+    def test_edits_keep_counters(self):
+        """
+        Проверяем, что изменение рецепта и пользователя, прочитанных
+        до изменения счетчиков, не затирает счетчики.
+        """
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Recipe.objects.create(name="second", text="text", cooking_time=1,
+                              author=self.author)
+
+        recipe.name = "new_name"
+        recipe.save()
+        author.first_name = "new_name"
+        author.save()
+        self._assert_counters(2, 1, 1, 1)
+
+        self.client.force_authenticate(self.author)
+        tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        ingredient = Ingredient.objects.create(name="сахар",
+                                               measurement_unit="г")
+        response = self.client.patch(
+            reverse("routers:recipes-detail", args=[self.recipe.pk]),
+            {"name": "api_name", "tags": [tag.id],
+             "ingredients": [{"id": ingredient.id, "amount": 1}]},
+            format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(reverse("routers:user-me"),
+                                     {"first_name": "api_name"},
+                                     format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_counters(2, 1, 1, 1)
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).name,
+                         "api_name")
@@ -112,6 +112,80 @@ class FollowTest(StandartTest):
         self._assert_serializer_is_correct(
             response.data.get("results")[FIRST_RESULT])
 
+    def test_subscriptions_cursor_pagination(self):
+        """
+        Проверяем вывод списка подписок с пагинацией по ключу.
+        """
+        url = reverse("routers:user-subscriptions")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.client.post(
+            reverse("routers:user-subscribe", args=[self.second_user.id]))
+
+        response = self.client.get(url, {"cursor": ""})
+        self.assertEqual(response.status_code,
+                         status.HTTP_200_OK,
+                         "Проверьте, что эндпойнт " +
+                         "возвращает статус HTTP_200_OK")
+        self.assertIsNone(response.data.get("next"),
+                          "Проверьте, что у последней страницы " +
+                          "нет ссылки на следующую.")
+        self._assert_serializer_is_correct(
+            response.data.get("results")[FIRST_RESULT])
+
+    def _create_author(self, number, recipes):
+        """Создает автора с рецептами, на которого подписан пользователь."""
+        author = User.objects.create_user(
+            email=f"author{number}@test.com",
+            username=f"author{number}",
+            password="HelloWorldSecurePassword"
+            )
+        for index in range(recipes):
+            Recipe.objects.create(name=f"recipe_{number}_{index}",
+                                  text="text", cooking_time=1, author=author)
+        Follow.objects.create(user=self.user, author=author)
+        return author
+
+    def test_subscriptions_recipes_limit(self):
+        """
+        Проверяем, что ?recipes_limit= ограничивает рецепты каждого
+        автора последними, а recipes_count считает все рецепты.
+        """
+        author = self._create_author(1, 5)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.get(reverse("routers:user-subscriptions"),
+                                   {"recipes_limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data["results"][FIRST_RESULT]
+        latest = list(Recipe.objects.filter(author=author).order_by(
+            "-id").values_list("id", flat=True)[:2])
+        self.assertEqual([recipe["id"] for recipe in data["recipes"]],
+                         latest,
+                         "Проверьте, что выводятся последние рецепты " +
+                         "автора в пределах recipes_limit.")
+        self.assertEqual(data["recipes_count"], 5)
+        self.assertTrue(data["is_subscribed"])
+
+        response = self.client.get(reverse("routers:user-subscriptions"),
+                                   {"recipes_limit": "много"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_subscriptions_query_count(self):
+        """
+        Проверяем, что число запросов к БД не зависит от числа авторов
+        на странице.
+        """
+        url = reverse("routers:user-subscriptions")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self._create_author(1, 3)
+        with self.assertNumQueries(4) as context:
+            self.client.get(url, {"recipes_limit": 2})
+        queries = len(context.captured_queries)
+        for number in range(2, 6):
+            self._create_author(number, 3)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, {"recipes_limit": 2})
+        self.assertEqual(len(response.data["results"]), 5)
+
     def _assert_response_code_is_unathorized(self, status_code):
         """Прооверяет, что код сооответствует 401_UNATHORIZED."""
         self.assertEqual(status_code,
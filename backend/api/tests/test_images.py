@@ -0,0 +1,392 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import Ingredient, MediaFile, Recipe, RecipeDocument, Tag
+from services import images
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+ORIENTATION_TAG = 0x0112
+# Поворот на 90 градусов по часовой стрелке.
+ROTATED_RIGHT = 6
+# BlurHash картинки make_gradient(), посчитанный эталонной библиотекой.
+GRADIENT_BLURHASH = 'LxH27h2lwtX3mAWUjwfAgFfmfTfi'
+
+
+def make_jpeg(width, height, orientation=None) -> bytes:
+    """Возвращает JPEG заданного размера с EXIF-ориентацией."""
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION_TAG] = orientation
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(output, 'JPEG', exif=exif)
+    return output.getvalue()
+
+
+def make_gradient() -> bytes:
+    """Возвращает PNG с цветным градиентом."""
+    image = Image.new('RGB', (32, 24))
+    image.putdata([(x * 8 % 256, y * 10 % 256, x * y % 256)
+                   for y in range(24) for x in range(32)])
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def processing(callbacks) -> list:
+    """Возвращает отложенные до фиксации запуски обработки картинок."""
+    return [callback for callback in callbacks
+            if callback.__qualname__.startswith('schedule_processing.')]
+
+
+def to_base64(content: bytes) -> str:
+    return 'data:image/jpeg;base64,' + base64.b64encode(content).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_SYNC=True,
+                   RECIPE_IMAGE_MAX_DIMENSION=200,
+                   RECIPE_IMAGE_VARIANTS={'thumbnail': 20, 'card': 100})
+class RecipeImageTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.user)
+        cls.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        cls.ingredient = Ingredient.objects.create(name="сахар",
+                                                   measurement_unit="г")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _post(self, image):
+        return self.client.post(reverse("routers:recipes-list"), {
+            "name": "recipe",
+            "text": "text",
+            "cooking_time": 1,
+            "image": image,
+            "tags": [self.tag.id],
+            "ingredients": [{"id": self.ingredient.id, "amount": 1}],
+        }, format="json")
+
+    def test_image_is_normalized_after_commit(self):
+        """
+        Проверяем, что после фиксации картинка поворачивается по EXIF,
+        уменьшается и подменяет исходную.
+        """
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self._post(to_base64(
+                make_jpeg(400, 100, ROTATED_RIGHT)))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            original = Recipe.objects.get(pk=response.data["id"]).image.name
+        self.assertEqual(len(processing(callbacks)), 1,
+                         "Проверьте, что обработка ждет фиксации транзакции.")
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        self.assertNotEqual(recipe.image.name, original)
+        self.assertEqual(MediaFile.objects.get(name=original).references, 0,
+                         "Проверьте, что исходная картинка освобождается.")
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.size, (50, 200),
+                             "Проверьте поворот и уменьшение картинки.")
+            self.assertNotIn(ORIENTATION_TAG, image.getexif())
+        self.assertIn(
+            recipe.image.name,
+            RecipeDocument.objects.get(recipe=recipe).data["image"],
+            "Проверьте, что представление рецепта ссылается на новую " +
+            "картинку.")
+
+    def test_replaced_image_is_kept(self):
+        """
+        Проверяем, что обработка не подменяет картинку, замененную
+        за время обработки.
+        """
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self._post(to_base64(make_jpeg(10, 10)))
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        original = recipe.image.name
+        folder = os.path.dirname(recipe.image.path)
+        files = set(os.listdir(folder))
+        Recipe.objects.filter(pk=recipe.pk).update(image="other.jpg")
+        self.assertFalse(images.process_image(recipe.pk, original))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, "other.jpg")
+        new_files = [os.path.join(os.path.dirname(original), file)
+                     for file in set(os.listdir(folder)) - files]
+        self.assertTrue(new_files)
+        self.assertEqual(
+            set(MediaFile.objects.filter(name__in=new_files).values_list(
+                "references", flat=True)),
+            {0},
+            "Проверьте, что результат обработки остается без ссылок.")
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+    def test_image_size_limit(self):
+        """Проверяем, что слишком большая картинка отклоняется."""
+        response = self._post(to_base64(make_jpeg(100, 100)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_line_wrapped_base64(self):
+        """
+        Проверяем, что base64 с переносами строк (MIME, по 76 символов)
+        принимается, в том числе когда перенос попадает на границу
+        декодируемых частей.
+        """
+        content = make_jpeg(40, 40)
+        wrapped = base64.encodebytes(content).decode().replace("\n", "\r\n")
+        with mock.patch("api.fields.DECODE_CHUNK_SIZE", 100):
+            response = self._post("data:image/jpeg;base64," + wrapped)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED,
+                         "Проверьте, что пробельные символы в base64 " +
+                         "пропускаются.")
+        with Recipe.objects.get(pk=response.data["id"]).image.open() as image:
+            self.assertEqual(image.read(), content)
+
+    def test_invalid_base64(self):
+        """Проверяем, что некорректный base64 отклоняется."""
+        response = self._post("data:image/jpeg;base64,@@@@")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+
+    def test_variants_and_placeholder(self):
+        """
+        Проверяем, что при обработке создаются уменьшенные копии
+        в WebP и JPEG и BlurHash, и они отдаются в ответах.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post(to_base64(make_jpeg(400, 100)))
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        self.assertEqual(set(recipe.image_variants), {"thumbnail", "card"})
+        for variant, size in (("thumbnail", (20, 5)), ("card", (100, 25))):
+            files = recipe.image_variants[variant]
+            for format, name in (("WEBP", files["webp"]),
+                                 ("JPEG", files["jpeg"])):
+                with Image.open(os.path.join(MEDIA_ROOT, name)) as image:
+                    self.assertEqual((image.format, image.size),
+                                     (format, size),
+                                     "Проверьте формат и размер копии.")
+        self.assertTrue(recipe.image_placeholder)
+
+        response = self.client.get(
+            reverse("routers:recipes-detail", args=[recipe.id]))
+        thumbnail = response.data["image_variants"]["thumbnail"]
+        self.assertEqual((thumbnail["width"], thumbnail["height"]), (20, 5))
+        self.assertTrue(thumbnail["webp"].startswith("http://"),
+                        "Проверьте, что ссылки на копии абсолютные.")
+        self.assertEqual(response.data["image_placeholder"],
+                         recipe.image_placeholder)
+        response = self.client.post(
+            reverse("routers:recipes-favorite", args=[recipe.id]))
+        self.assertEqual(response.data["image_variants"]["card"]["width"],
+                         100,
+                         "Проверьте, что короткий рецепт отдает копии.")
+
+    def test_placeholder_matches_blurhash(self):
+        """Проверяем, что заглушка совпадает с эталонным BlurHash."""
+        recipe = Recipe.objects.create(
+            name="gradient", text="text", cooking_time=1, author=self.user,
+            image=ContentFile(make_gradient(), name="gradient.png"))
+        self.assertTrue(images.process_image(recipe.pk, recipe.image.name))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_placeholder, GRADIENT_BLURHASH)
+
+    def test_backfill_command(self):
+        """
+        Проверяем, что команда обрабатывает только картинки
+        без уменьшенных копий.
+        """
+        recipes = [
+            Recipe.objects.create(
+                name=f"recipe_{number}", text="text", cooking_time=1,
+                author=self.user,
+                image=ContentFile(make_jpeg(300, 300), name="old.jpg"))
+            for number in range(3)
+        ]
+        images.process_image(recipes[0].pk, recipes[0].image.name)
+        processed = Recipe.objects.get(pk=recipes[0].pk).image.name
+        output = io.StringIO()
+        call_command("backfill_recipe_images", "--workers", "0",
+                     "--chunk-size", "1", stdout=output)
+        self.assertIn("обработано картинок: 2", output.getvalue())
+        self.assertEqual(Recipe.objects.get(pk=recipes[0].pk).image.name,
+                         processed)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.image_variants["card"]["width"], 100)
+            with Image.open(recipe.image.path) as image:
+                self.assertEqual(image.size, (200, 200))
+
+    def _post_multipart(self, data, image):
+        return self.client.post(reverse("routers:recipes-list"), {
+            "data": data,
+            "image": SimpleUploadedFile("photo.jpg", image,
+                                        content_type="image/jpeg"),
+        }, format="multipart")
+
+    def _recipe_json(self):
+        return json.dumps({
+            "name": "recipe",
+            "text": "text",
+            "cooking_time": 1,
+            "tags": [self.tag.id],
+            "ingredients": [{"id": self.ingredient.id, "amount": 1}],
+        })
+
+    def test_multipart_upload(self):
+        """
+        Проверяем, что рецепт создается из multipart-запроса с файлом
+        и JSON-частью.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post_multipart(
+                self._recipe_json(), make_jpeg(400, 100, ROTATED_RIGHT))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        self.assertEqual(
+            list(recipe.ingredientforrecipe_set.values_list(
+                "ingredient_id", "amount")),
+            [(self.ingredient.id, 1)])
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.size, (50, 200),
+                             "Проверьте, что загруженный файл " +
+                             "обрабатывается так же, как base64.")
+
+    def test_multipart_invalid_json(self):
+        """Проверяем, что некорректная JSON-часть отклоняется."""
+        for data in ("{", "[1, 2]"):
+            response = self._post_multipart(data, make_jpeg(10, 10))
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+    def test_multipart_size_limit(self):
+        """Проверяем, что слишком большой файл отклоняется."""
+        response = self._post_multipart(self._recipe_json(),
+                                        make_jpeg(100, 100))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_SYNC=True)
+class MediaFileTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.user)
+        cls.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        cls.ingredient = Ingredient.objects.create(name="сахар",
+                                                   measurement_unit="г")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _create(self, content, name="photo.jpg"):
+        return Recipe.objects.create(name="recipe", text="text",
+                                     cooking_time=1, author=self.user,
+                                     image=ContentFile(content, name=name))
+
+    def _collect(self):
+        call_command("collect_media_garbage", "--grace-period", "0",
+                     stdout=io.StringIO())
+
+    def test_identical_uploads_are_stored_once(self):
+        """
+        Проверяем, что одинаковые картинки хранятся одним файлом
+        под хэшем содержимого.
+        """
+        content = make_jpeg(10, 10)
+        first = self._create(content, "first.jpg")
+        second = self._create(content, "second.JPG")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(os.path.basename(first.image.name),
+                         r"^[0-9a-f]{64}\.jpg$")
+        self.assertEqual(MediaFile.objects.get(
+            name=first.image.name).references, 2)
+
+    def test_garbage_collection(self):
+        """
+        Проверяем, что сборщик мусора удаляет только файлы,
+        на которые не осталось ссылок.
+        """
+        content = make_jpeg(10, 10)
+        first = self._create(content)
+        second = self._create(content)
+        other = self._create(make_jpeg(20, 20))
+        path, other_path = first.image.path, other.image.path
+        first.delete()
+        self._collect()
+        self.assertTrue(os.path.exists(path),
+                        "Проверьте, что файл с ссылками не удаляется.")
+        second.delete()
+        other.delete()
+        call_command("collect_media_garbage", stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path),
+                        "Проверьте, что недавно освобожденный файл " +
+                        "не удаляется.")
+        self._collect()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(other_path))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_same_image_on_update(self):
+        """
+        Проверяем, что повторная отправка текущей картинки при
+        изменении рецепта не создает файлов и не запускает обработку.
+        """
+        recipe = self._create(make_jpeg(10, 10))
+        images.process_image(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db()
+        with open(recipe.image.path, "rb") as file:
+            content = file.read()
+        references = dict(MediaFile.objects.values_list("name", "references"))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.patch(
+                reverse("routers:recipes-detail", args=[recipe.id]),
+                {"image": to_base64(content),
+                 "tags": [self.tag.id],
+                 "ingredients": [{"id": self.ingredient.id, "amount": 1}]},
+                format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(processing(callbacks), [])
+        updated = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(updated.image.name, recipe.image.name)
+        self.assertEqual(updated.image_variants, recipe.image_variants)
+        self.assertEqual(
+            dict(MediaFile.objects.values_list("name", "references")),
+            references)
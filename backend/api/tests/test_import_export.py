@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import (Ingredient, IngredientForRecipe, MediaFile, Recipe,
+                         RecipeDocument, Tag)
+from users.models import User
+
+from .test_images import make_jpeg
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RECIPES_COUNT = 7
+CHUNK_SIZE = 3
+
+
+def snapshot():
+    """Возвращает рецепты в виде, не зависящем от id."""
+    return sorted(
+        (recipe.author.email, recipe.name, recipe.text,
+         recipe.cooking_time, recipe.image.name or None,
+         tuple(recipe.tags.order_by('slug').values_list('slug', flat=True)),
+         tuple(recipe.ingredientforrecipe_set.order_by(
+             'ingredient__name').values_list(
+                 'ingredient__name', 'ingredient__measurement_unit',
+                 'amount')))
+        for recipe in Recipe.objects.select_related('author'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImportExportTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        authors = [User.objects.create_user(email=f"author{number}@test.com",
+                                            username=f"author{number}",
+                                            first_name="Имя",
+                                            last_name="Фамилия",
+                                            password="HelloWorld12345")
+                   for number in range(2)]
+        tags = [Tag.objects.create(name="Завтрак", slug="breakfast"),
+                Tag.objects.create(name="Обед", slug="lunch")]
+        ingredients = [Ingredient.objects.create(name=name,
+                                                 measurement_unit="г")
+                       for name in ("мука", "сахар", "соль")]
+        with override_settings(MEDIA_ROOT=MEDIA_ROOT):
+            image = Recipe.image.field.storage.save(
+                "media/recipes/images/photo.jpg",
+                ContentFile(make_jpeg(8, 8)))
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[number % 2], name=f"Пирог {number}",
+                text="Печь\tчас", cooking_time=number + 1,
+                image=image if number % 3 == 0 else None)
+            recipe.tags.set(tags[:number % 2 + 1])
+            for amount, ingredient in enumerate(ingredients[number % 2:], 1):
+                IngredientForRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "recipes.jsonl")
+        self.output = open(os.devnull, "w")
+        self.addCleanup(self.output.close)
+
+    def test_export_import(self):
+        """
+        Проверяем, что выгруженные рецепты загружаются обратно
+        с авторами, тэгами, ингредиентами и картинками, а производные
+        данные, которые обходит bulk_create, обновляются.
+        """
+        expected = snapshot()
+        self._export()
+        with open(self.path, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), RECIPES_COUNT,
+                             "Проверьте, что каждый рецепт выгружается " +
+                             "отдельной строкой.")
+        Recipe.objects.all().delete()
+        User.objects.filter(email="author1@test.com").delete()
+        Tag.objects.filter(slug="lunch").delete()
+        Ingredient.objects.filter(name="мука").delete()
+
+        self._import()
+        self.assertEqual(snapshot(), expected,
+                         "Проверьте, что рецепты загружаются полностью, " +
+                         "а недостающие авторы, тэги и ингредиенты " +
+                         "создаются.")
+        self.assertEqual(RecipeDocument.objects.count(), RECIPES_COUNT,
+                         "Проверьте, что представления рецептов собираются.")
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.tags_mask,
+                             sum(1 << (tag.pk - 1)
+                                 for tag in recipe.tags.all()))
+        for user in User.objects.all():
+            self.assertEqual(user.recipes_count,
+                             Recipe.objects.filter(author=user).count(),
+                             "Проверьте, что счетчики рецептов " +
+                             "авторов обновляются.")
+        self.assertEqual(
+            MediaFile.objects.get(
+                name=Recipe.objects.exclude(image=None).first().image.name
+            ).references, 3,
+            "Проверьте, что ссылки на картинки учитываются.")
+        self.assertFalse(
+            User.objects.get(email="author1@test.com").has_usable_password())
+        response = self.client.get(reverse("routers:recipes-list"),
+                                   {"search": "пирог", "limit": 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], RECIPES_COUNT,
+                         "Проверьте, что рецепты попадают в поисковый " +
+                         "индекс.")
+
+    def test_inline_images(self):
+        """
+        Проверяем, что вложенные картинки сохраняются в хранилище
+        под тем же именем.
+        """
+        name = Recipe.objects.exclude(image=None).first().image.name
+        self._export(inline_images=True)
+        Recipe.objects.all().delete()
+        os.remove(os.path.join(MEDIA_ROOT, name))
+        self._import()
+        self.assertTrue(os.path.exists(os.path.join(MEDIA_ROOT, name)),
+                        "Проверьте, что вложенная картинка сохраняется.")
+        self.assertEqual(Recipe.objects.filter(image=name).count(), 3)
+
+    def test_resume(self):
+        """
+        Проверяем, что после сбоя загрузка продолжается с первой
+        незафиксированной порции и не создает дубликатов.
+        """
+        expected = snapshot()
+        self._export()
+        Recipe.objects.all().delete()
+        fsync = os.fsync
+        calls = []
+
+        def fail_second_chunk(descriptor):
+            # Строки соответствия второй порции уже записаны.
+            calls.append(descriptor)
+            if len(calls) == 2:
+                raise OSError("Сбой")
+            fsync(descriptor)
+
+        with mock.patch("os.fsync", fail_second_chunk), \
+                self.assertRaises(OSError):
+            self._import()
+        self.assertEqual(Recipe.objects.count(), CHUNK_SIZE,
+                         "Проверьте, что каждая порция загружается " +
+                         "в своей транзакции.")
+        self._import()
+        self.assertEqual(snapshot(), expected,
+                         "Проверьте, что повторный запуск дозагружает " +
+                         "рецепты без дубликатов.")
+        self._import()
+        self.assertEqual(Recipe.objects.count(), RECIPES_COUNT)
+        with open(f"{self.path}.ids", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), RECIPES_COUNT,
+                             "Проверьте, что в соответствии id нет " +
+                             "строк откатившихся порций.")
+
+    def test_invalid_line(self):
+        """Проверяем, что битая строка останавливает загрузку."""
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"name": "без id"}) + "\n")
+        with self.assertRaises(CommandError):
+            self._import()
+
+    def _export(self, **options):
+        call_command("export_recipes", self.path, chunk_size=CHUNK_SIZE,
+                     stdout=self.output, **options)
+
+    def _import(self):
+        call_command("import_recipes", self.path, chunk_size=CHUNK_SIZE,
+                     stdout=self.output)
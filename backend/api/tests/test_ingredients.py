@@ -1,3 +1,12 @@
+import io
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.exceptions import NotFound
 from rest_framework.reverse import reverse
@@ -72,3 +81,126 @@ class IngredientsTest(APITestCase):
         "Проверяет, что эндпойнт что-либо возвращает."
         self.assertIsInstance(data, dict,
                               "Проверьте, что эндпойнт что-либо возвращает.")
+
+
+class IngredientSearchTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        for name in ("Мёд", "Медовик", "Сахар медовый",
+                     "Молоко", "мед акации"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+
+    def test_prefix_before_substring(self):
+        """
+        Проверяем, что поиск не зависит от регистра и буквы ё,
+        а совпадения с начала названия идут раньше совпадений внутри.
+        """
+        self.assertEqual(self._search("МЕД"),
+                         ["Мёд", "мед акации", "Медовик", "Сахар медовый"],
+                         "Проверьте, что поиск ингредиентов нормализует " +
+                         "регистр и ё, а префиксные совпадения идут первыми.")
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_search_limit(self):
+        """Проверяем, что размер выдачи поиска ограничен."""
+        self.assertEqual(len(self._search("мё")), 2)
+
+    def test_index_refreshes(self):
+        """Проверяем, что индекс обновляется при изменении ингредиентов."""
+        self.assertEqual(self._search("молок"), ["Молоко"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name="Молоко топленое",
+                                      measurement_unit="мл")
+        self.assertEqual(self._search("молок"),
+                         ["Молоко", "Молоко топленое"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.filter(name="Молоко").first().delete()
+        self.assertEqual(self._search("молок"), ["Молоко топленое"])
+
+    def _search(self, name):
+        """Возвращает названия найденных ингредиентов."""
+        response = self.client.get(reverse("routers:ingredients-list"),
+                                   {"name": name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [data["name"] for data in response.data]
+
+
+class IngredientUploadTest(APITestCase):
+    ROWS = [("соль", "г"), ("вода", "мл"), ("соль", "г"),
+            ("", "г"), ("сок \"Лимон\"\tсвежий", "мл")]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_upload_is_idempotent(self):
+        """
+        Проверяем, что ингредиенты из CSV и JSON из каталога data
+        загружаются полностью, а повторная загрузка ничего не меняет.
+        """
+        output = self._upload(settings.BASE_DIR / "data/ingredients.csv")
+        count = Ingredient.objects.count()
+        self.assertEqual(count, 2188,
+                         "Проверьте, что загружаются все ингредиенты.")
+        self.assertIn("добавлено ингредиентов: 2188", output)
+        output = self._upload(settings.BASE_DIR / "data/ingredients.json")
+        self.assertEqual(Ingredient.objects.count(), count,
+                         "Проверьте, что повторная загрузка " +
+                         "не создает дубликаты.")
+        self.assertIn("добавлено ингредиентов: 0", output)
+
+    def test_upload_rows(self):
+        """
+        Проверяем, что дубликаты и пустые строки пропускаются,
+        кавычки и табуляции сохраняются, а прогресс выводится
+        после каждой порции.
+        """
+        for path in (self._write_csv(), self._write_json()):
+            output = self._upload(path, batch_size=2)
+            self.assertEqual(output.count("Прочитано строк"), 2,
+                             "Проверьте, что команда сообщает о прогрессе.")
+            self.assertIn("пропущено некорректных: 1", output)
+            self.assertEqual(
+                sorted(Ingredient.objects.values_list(
+                    "name", "measurement_unit")),
+                sorted(set(self.ROWS[:3] + self.ROWS[4:])),
+                "Проверьте, что загружаются только корректные строки " +
+                "без дубликатов.")
+
+    def test_upload_refreshes_catalog(self):
+        """Проверяем, что загрузка обновляет закэшированный справочник."""
+        url = reverse("routers:ingredients-list")
+        self.assertEqual(self.client.get(url).data, [])
+        self._upload(self._write_csv())
+        self.assertEqual(len(self.client.get(url).data), 3,
+                         "Проверьте, что после загрузки справочник " +
+                         "ингредиентов собирается заново.")
+
+    def test_unique_constraint(self):
+        """Проверяем, что одинаковые ингредиенты нельзя создать дважды."""
+        Ingredient.objects.create(name="соль", measurement_unit="г")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.create(name="соль", measurement_unit="г")
+
+    def _write_csv(self):
+        path = os.path.join(self.directory.name, "ingredients.csv")
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            file.write("name, measurement_unit\n")
+            for name, unit in self.ROWS:
+                escaped = name.replace('"', '""')
+                file.write(f'"{escaped}",{unit}\n')
+        return path
+
+    def _write_json(self):
+        path = os.path.join(self.directory.name, "ingredients.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump([{"name": name, "measurement_unit": unit}
+                       for name, unit in self.ROWS], file, indent=2)
+        return path
+
+    def _upload(self, path, **options):
+        """Запускает загрузку и возвращает ее вывод."""
+        output = io.StringIO()
+        call_command("upload_data", str(path), stdout=output, **options)
+        return output.getvalue()
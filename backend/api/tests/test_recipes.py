@@ -0,0 +1,636 @@
+import base64
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                         RecipeDocument, ShoppingCart, Tag)
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RECIPES_COUNT = 12
+PAGE_LIMITS = (1, 5, RECIPES_COUNT)
+MISSING_ID = 10 ** 6
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipesTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            first_name="first_test",
+            last_name="last_test",
+            password="HelloWorldSecurePassword"
+            )
+        cls.author = User.objects.create_user(
+            email="test2@test.com",
+            username="testuser2",
+            first_name="first_test2",
+            last_name="last_test2",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(
+            user=RecipesTest.user)
+        cls.tags = [
+            Tag.objects.create(name="Завтрак", color="#E26C2D",
+                               slug="breakfast"),
+            Tag.objects.create(name="Обед", color="#49B64E", slug="lunch"),
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"ingredient_{number}",
+                                      measurement_unit="г")
+            for number in range(3)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                name=f"test_recipe_{number}",
+                text="test_text",
+                image=SimpleUploadedFile('small.gif',
+                                         SMALL_GIF,
+                                         content_type='image/gif'),
+                cooking_time=number + 1,
+                author=RecipesTest.author
+            )
+            recipe.tags.set(RecipesTest.tags)
+            for ingredient in RecipesTest.ingredients:
+                IngredientForRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1)
+            if number % 2:
+                Favorite.objects.create(user=RecipesTest.user, recipe=recipe)
+            else:
+                ShoppingCart.objects.create(user=RecipesTest.user,
+                                            recipe=recipe)
+        Follow.objects.create(user=RecipesTest.user, author=RecipesTest.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_queries_do_not_depend_on_page_size_for_anonymous(self):
+        """
+        Проверяем, что число запросов к БД у списка рецептов
+        не зависит от размера страницы для анонимного пользователя.
+        """
+        self._assert_queries_do_not_depend_on_page_size()
+
+    def test_list_queries_do_not_depend_on_page_size_for_user(self):
+        """
+        Проверяем, что число запросов к БД у списка рецептов
+        не зависит от размера страницы для авторизованного пользователя.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self._assert_queries_do_not_depend_on_page_size()
+
+    def test_list_flags(self):
+        """
+        Проверяем, что флаги пользователя в списке рецептов корректны.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.get(reverse("routers:recipes-list"),
+                                   {"limit": RECIPES_COUNT})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for data in response.data.get("results"):
+            recipe = Recipe.objects.get(id=data["id"])
+            with self.subTest(recipe=recipe.name):
+                self.assertEqual(
+                    data["is_favorited"],
+                    Favorite.objects.filter(recipe=recipe).exists(),
+                    "Проверьте, что поле is_favorited корректно.")
+                self.assertEqual(
+                    data["is_in_shopping_cart"],
+                    ShoppingCart.objects.filter(recipe=recipe).exists(),
+                    "Проверьте, что поле is_in_shopping_cart корректно.")
+                self.assertTrue(
+                    data["author"]["is_subscribed"],
+                    "Проверьте, что поле is_subscribed автора корректно.")
+                self.assertEqual(
+                    [tag["slug"] for tag in data["tags"]],
+                    ["breakfast", "lunch"],
+                    "Проверьте, что тэги рецепта выдаются корректно.")
+                self.assertEqual(
+                    data["ingredients"][0],
+                    {"id": self.ingredients[0].id,
+                     "name": self.ingredients[0].name,
+                     "measurement_unit": "г",
+                     "amount": recipe.cooking_time},
+                    "Проверьте, что ингредиенты рецепта выдаются корректно.")
+
+    def test_detail_for_anonymous(self):
+        """
+        Проверяем, что анонимному пользователю флаги выдаются ложными.
+        """
+        recipe = Recipe.objects.first()
+        response = self.client.get(
+            reverse("routers:recipes-detail", args=[recipe.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["is_favorited"])
+        self.assertFalse(response.data["is_in_shopping_cart"])
+        self.assertFalse(response.data["author"]["is_subscribed"])
+
+    def test_cursor_pagination(self):
+        """
+        Проверяем, что пагинация по ключу проходит все рецепты
+        по порядку без повторов.
+        """
+        url = reverse("routers:recipes-list")
+        params = {"cursor": "", "limit": 5}
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data,
+                             "Проверьте, что пагинация по ключу " +
+                             "не считает общее число объектов.")
+            ids.extend(data["id"] for data in response.data["results"])
+            url, params = response.data["next"], None
+        self.assertEqual(
+            ids,
+            list(Recipe.objects.order_by('-id').values_list('id', flat=True)),
+            "Проверьте, что пагинация по ключу выдает все рецепты " +
+            "в порядке сортировки модели.")
+
+    def test_count_is_cached(self):
+        """
+        Проверяем, что общее число рецептов кэшируется
+        и пересчитывается после изменений.
+        """
+        url = reverse("routers:recipes-list")
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        self.assertEqual(response.data["count"], RECIPES_COUNT)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url, {"page": 2})
+        self.assertEqual(response.data["count"], RECIPES_COUNT)
+        self.assertEqual(len(second.captured_queries),
+                         len(first.captured_queries) - 1,
+                         "Проверьте, что число рецептов берется из кэша.")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(name="new_recipe", text="test_text",
+                                  cooking_time=1, author=self.author)
+        response = self.client.get(url)
+        self.assertEqual(response.data["count"], RECIPES_COUNT + 1,
+                         "Проверьте, что кэш сбрасывается при изменении " +
+                         "рецептов.")
+
+    def test_user_filtered_count_is_invalidated(self):
+        """
+        Проверяем, что число рецептов в избранном пересчитывается
+        после изменения избранного.
+        """
+        url = reverse("routers:recipes-list")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        favorites = Favorite.objects.filter(user=self.user)
+        response = self.client.get(url, {"is_favorited": 1})
+        self.assertEqual(response.data["count"], favorites.count())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            favorites.first().delete()
+        response = self.client.get(url, {"is_favorited": 1})
+        self.assertEqual(response.data["count"], favorites.count(),
+                         "Проверьте, что кэш сбрасывается при изменении " +
+                         "избранного.")
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["count"], RECIPES_COUNT)
+
+    def test_document_follows_related_changes(self):
+        """
+        Проверяем, что готовое представление рецепта пересобирается
+        при изменении тэга, ингредиента и автора.
+        """
+        recipe = Recipe.objects.first()
+        url = reverse("routers:recipes-detail", args=[recipe.id])
+
+        tag = self.tags[0]
+        tag.name = "Ужин"
+        tag.save()
+        self.author.first_name = "new_first_name"
+        self.author.save()
+        self.ingredients[1].delete()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["tags"][0]["name"], "Ужин",
+                         "Проверьте, что представление рецепта " +
+                         "обновляется при изменении тэга.")
+        self.assertEqual(response.data["author"]["first_name"],
+                         "new_first_name",
+                         "Проверьте, что представление рецепта " +
+                         "обновляется при изменении автора.")
+        self.assertEqual(
+            [ingredient["id"] for ingredient in response.data["ingredients"]],
+            [self.ingredients[0].id, self.ingredients[2].id],
+            "Проверьте, что представление рецепта " +
+            "обновляется при удалении ингредиента.")
+
+    def test_recipe_delete_removes_document(self):
+        """Проверяем, что удаление рецепта удаляет его представление."""
+        recipe = Recipe.objects.first()
+        recipe.delete()
+        self.assertFalse(
+            RecipeDocument.objects.filter(recipe_id=recipe.id).exists())
+
+    def test_rebuild_documents_command(self):
+        """Проверяем команду пересборки представлений рецептов."""
+        RecipeDocument.objects.all().delete()
+        call_command("rebuild_recipe_documents", chunk_size=5,
+                     stdout=open(os.devnull, "w"))
+        self.assertEqual(RecipeDocument.objects.count(), RECIPES_COUNT,
+                         "Проверьте, что команда пересобирает " +
+                         "представления всех рецептов.")
+
+    def test_anonymous_responses_are_cached(self):
+        """
+        Проверяем, что ответы анонимным пользователям кэшируются
+        без учета порядка параметров запроса.
+        """
+        url = reverse("routers:recipes-list")
+        self.client.get(url, {"tags": ["lunch", "breakfast"], "limit": 3})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, {"limit": 3, "tags": ["breakfast", "lunch"]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = self.client.get(url, {"limit": 3})
+        self.assertTrue(response.data["results"][0]["is_favorited"]
+                        or response.data["results"][0]["is_in_shopping_cart"],
+                        "Проверьте, что авторизованному пользователю " +
+                        "не выдается закэшированный анонимный ответ.")
+
+    def test_anonymous_cache_is_invalidated(self):
+        """
+        Проверяем, что удаленный рецепт не выдается из кэша.
+        """
+        recipe = Recipe.objects.first()
+        list_url = reverse("routers:recipes-list")
+        detail_url = reverse("routers:recipes-detail", args=[recipe.id])
+        self.client.get(list_url)
+        self.client.get(detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND,
+                         "Проверьте, что удаленный рецепт " +
+                         "не выдается из кэша.")
+        response = self.client.get(list_url)
+        self.assertNotIn(recipe.id,
+                         [data["id"] for data in response.data["results"]])
+
+        tag = self.tags[0]
+        tag.name = "Ужин"
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        response = self.client.get(list_url)
+        self.assertEqual(response.data["results"][0]["tags"][0]["name"],
+                         "Ужин",
+                         "Проверьте, что кэш сбрасывается при изменении " +
+                         "тэга.")
+
+    def _assert_queries_do_not_depend_on_page_size(self):
+        """Сравнивает число запросов для разных размеров страницы."""
+        url = reverse("routers:recipes-list")
+        self.client.get(url)
+        queries = []
+        for limit in PAGE_LIMITS:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data.get("results")), limit)
+            queries.append(len(context.captured_queries))
+        self.assertEqual(len(set(queries)), 1,
+                         "Проверьте, что число запросов к БД не зависит " +
+                         f"от размера страницы: {queries}")
+
+
+class RecipeTagsFilterTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            first_name="first_test",
+            last_name="last_test",
+            password="HelloWorldSecurePassword"
+            )
+        cls.breakfast = Tag.objects.create(name="Завтрак", color="#E26C2D",
+                                           slug="breakfast")
+        cls.lunch = Tag.objects.create(name="Обед", color="#49B64E",
+                                       slug="lunch")
+        cls.dinner = Tag.objects.create(id=100, name="Ужин",
+                                        color="#8775fD2", slug="dinner")
+        cls.recipes = {}
+        for name, tags in (("both", [cls.breakfast, cls.lunch]),
+                           ("breakfast", [cls.breakfast]),
+                           ("lunch", [cls.lunch]),
+                           ("dinner", [cls.dinner, cls.lunch]),
+                           ("none", [])):
+            recipe = Recipe.objects.create(name=name, text="test_text",
+                                           cooking_time=1, author=cls.author)
+            recipe.tags.set(tags)
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tags_any(self):
+        """
+        Проверяем, что фильтр по любому из тэгов выдает
+        каждый рецепт один раз.
+        """
+        self.assertEqual(self._get_names(tags=["breakfast", "lunch"]),
+                         ["both", "breakfast", "dinner", "lunch"])
+
+    def test_tags_all(self):
+        """Проверяем фильтр по всем тэгам сразу."""
+        self.assertEqual(
+            self._get_names(tags=["breakfast", "lunch"], tags_match="all"),
+            ["both"])
+
+    def test_tags_outside_mask(self):
+        """Проверяем фильтр по тэгам, не помещающимся в маску."""
+        self.assertEqual(self._get_names(tags=["dinner", "breakfast"]),
+                         ["both", "breakfast", "dinner"])
+        self.assertEqual(
+            self._get_names(tags=["dinner", "lunch"], tags_match="all"),
+            ["dinner"])
+
+    def test_tags_filter_uses_mask_list(self):
+        """
+        Проверяем, что фильтр перечисляет подходящие маски, чтобы
+        работал индекс, а при слишком большом их кол-ве проверяет
+        маску побитовым И.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self._get_names(tags=["breakfast"])
+        self.assertTrue(
+            any('"tags_mask" IN' in query["sql"]
+                for query in queries.captured_queries),
+            "Проверьте, что фильтр по маске использует список масок.")
+        with mock.patch("services.tag.MAX_MATCHING_MASKS", 0):
+            self.assertEqual(self._get_names(tags=["breakfast", "lunch"]),
+                             ["both", "breakfast", "dinner", "lunch"])
+            self.assertEqual(self._get_names(tags=["breakfast", "lunch"],
+                                             tags_match="all"),
+                             ["both"])
+
+    def test_mask_follows_tag_changes(self):
+        """
+        Проверяем, что маска тэгов пересчитывается при изменении
+        тэгов рецепта и удалении тэга.
+        """
+        self.recipes["none"].tags.add(self.lunch)
+        self.assertIn("none", self._get_names(tags=["lunch"]))
+
+        self.breakfast.tags.clear()
+        self.assertEqual(self._get_names(tags=["breakfast"]), [])
+
+        self.lunch.delete()
+        for recipe in Recipe.objects.all():
+            with self.subTest(recipe=recipe.name):
+                self.assertEqual(recipe.tags_mask, 0)
+
+    def _get_names(self, **params):
+        """Возвращает отсортированные названия рецептов из выдачи."""
+        response = self.client.get(reverse("routers:recipes-list"),
+                                   {"limit": 100, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"],
+                         len(response.data["results"]),
+                         "Проверьте, что рецепты в выдаче не повторяются.")
+        return sorted(data["name"] for data in response.data["results"])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeUpdateTest(APITestCase):
+    """Изменение рецепта затрагивает только изменившиеся строки."""
+    NO_OP_QUERIES = 10
+    SINGLE_CHANGE_QUERIES = 16
+    FULL_REPLACE_QUERIES = 20
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f"tag_{number}", slug=f"tag_{number}")
+            for number in range(4)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"ingredient_{number}",
+                                      measurement_unit="г")
+            for number in range(4)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.recipe = Recipe.objects.create(
+            name="test_recipe",
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif'),
+            text="text",
+            cooking_time=1,
+            author=self.author
+        )
+        self.recipe.tags.set(self.tags[:2])
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(recipe=self.recipe, ingredient=ingredient,
+                                amount=10)
+            for ingredient in self.ingredients[:2])
+        self.url = reverse("routers:recipes-detail", args=[self.recipe.id])
+
+    def _patch(self, tags, amounts, queries):
+        data = {
+            "tags": [tag.id for tag in tags],
+            "ingredients": [{"id": ingredient.id, "amount": amount}
+                            for ingredient, amount in amounts.items()],
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            len(context.captured_queries), queries,
+            "Проверьте, что при изменении рецепта переписываются " +
+            "только изменившиеся тэги и ингредиенты.")
+        self.assertEqual(
+            set(self.recipe.tags.values_list("id", flat=True)),
+            {tag.id for tag in tags})
+        self.assertEqual(
+            dict(IngredientForRecipe.objects.filter(
+                recipe=self.recipe).values_list("ingredient_id", "amount")),
+            {ingredient.id: amount for ingredient, amount in amounts.items()})
+        return context
+
+    def test_no_op_update(self):
+        """Проверяем, что неизменный состав не переписывается."""
+        first, second = self.ingredients[:2]
+        document = RecipeDocument.objects.get(recipe=self.recipe).data
+        context = self._patch(self.tags[:2], {first: 10, second: 10},
+                              self.NO_OP_QUERIES)
+        writes = [query["sql"] for query in context.captured_queries
+                  if not query["sql"].startswith(
+                      ("SELECT", "SAVEPOINT", "RELEASE SAVEPOINT"))]
+        self.assertEqual(writes, [],
+                         "Проверьте, что неизмененный рецепт " +
+                         "не сохраняется и не переиндексируется.")
+        self.assertEqual(RecipeDocument.objects.get(recipe=self.recipe).data,
+                         document)
+
+    def test_field_update(self):
+        """
+        Проверяем, что изменившееся поле сохраняется, попадает
+        в поисковый индекс и представление рецепта.
+        """
+        response = self.client.patch(self.url, {
+            "name": "Пирог",
+            "tags": [tag.id for tag in self.tags[:2]],
+            "ingredients": [{"id": ingredient.id, "amount": 10}
+                            for ingredient in self.ingredients[:2]],
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            RecipeDocument.objects.get(recipe=self.recipe).data["name"],
+            "Пирог")
+        response = self.client.get(reverse("routers:recipes-list"),
+                                   {"search": "пирог"})
+        self.assertEqual([data["id"] for data in response.data["results"]],
+                         [self.recipe.id])
+
+    def test_update_invalidates_cache(self):
+        """
+        Проверяем, что изменение только ингредиентов или тэгов
+        сбрасывает кэш ответов анонимам и ETag рецепта.
+        """
+        first, second = self.ingredients[:2]
+        anonymous = self.client_class()
+        response = anonymous.get(self.url)
+        etag = response.headers["ETag"]
+        for tags, amounts in ((self.tags[:2], {first: 10, second: 15}),
+                              (self.tags[1:3], {first: 10, second: 15})):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(self.url, {
+                    "tags": [tag.id for tag in tags],
+                    "ingredients": [{"id": ingredient.id, "amount": amount}
+                                    for ingredient, amount in amounts.items()],
+                }, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK,
+                             "Проверьте, что после изменения рецепта " +
+                             "старый ETag не подходит.")
+            self.assertEqual(
+                {data["id"]: data["amount"]
+                 for data in response.data["ingredients"]},
+                {ingredient.id: amount
+                 for ingredient, amount in amounts.items()},
+                "Проверьте, что аноним получает измененный рецепт.")
+            self.assertEqual([data["id"] for data in response.data["tags"]],
+                             [tag.id for tag in tags])
+            etag = response.headers["ETag"]
+
+    def test_single_change_update(self):
+        """Проверяем, что меняется только одно количество."""
+        first, second = self.ingredients[:2]
+        self._patch(self.tags[:2], {first: 10, second: 15},
+                    self.SINGLE_CHANGE_QUERIES)
+
+    def test_full_replace_update(self):
+        """Проверяем полную замену тэгов и ингредиентов."""
+        third, fourth = self.ingredients[2:]
+        self._patch(self.tags[2:], {third: 5, fourth: 7},
+                    self.FULL_REPLACE_QUERIES)
+
+    def test_missing_references(self):
+        """
+        Проверяем, что несуществующие тэги и ингредиенты отклоняются
+        до записи с ошибками у конкретных элементов.
+        """
+        first = self.ingredients[0]
+        data = {
+            "name": "new_recipe",
+            "text": "text",
+            "cooking_time": 1,
+            "image": "data:image/gif;base64," +
+                     base64.b64encode(SMALL_GIF).decode(),
+            "tags": [self.tags[0].id, MISSING_ID],
+            "ingredients": [{"id": first.id, "amount": 1},
+                            {"id": MISSING_ID, "amount": 1}],
+        }
+        recipes_count = Recipe.objects.count()
+        response = self.client.post(reverse("routers:recipes-list"), data,
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data["tags"]), [1],
+                         "Проверьте, что ошибка указывает на тэг.")
+        self.assertEqual(response.data["ingredients"][0], {})
+        self.assertIn("id", response.data["ingredients"][1],
+                      "Проверьте, что ошибка указывает на ингредиент.")
+        self.assertEqual(Recipe.objects.count(), recipes_count)
+
+    def test_duplicate_ingredients(self):
+        """Проверяем, что повторяющиеся ингредиенты отклоняются."""
+        first = self.ingredients[0]
+        response = self.client.patch(self.url, {
+            "tags": [self.tags[0].id],
+            "ingredients": [{"id": first.id, "amount": 1},
+                            {"id": first.id, "amount": 2}],
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_validation_query_count(self):
+        """
+        Проверяем, что тэги и ингредиенты проверяются одним запросом
+        на каждый список.
+        """
+        with CaptureQueriesContext(connection) as context:
+            self.client.patch(self.url, {
+                "tags": [MISSING_ID],
+                "ingredients": [{"id": MISSING_ID, "amount": 1}],
+            }, format="json")
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.patch(self.url, {
+                "tags": [tag.id for tag in self.tags] + [MISSING_ID],
+                "ingredients": [{"id": ingredient.id, "amount": 1}
+                                for ingredient in self.ingredients]
+                + [{"id": MISSING_ID, "amount": 1}],
+            }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from food.models import Recipe, Tag
+from users.models import User
+
+
+class RecipeSearchTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            first_name="first_test",
+            last_name="last_test",
+            password="HelloWorldSecurePassword"
+            )
+        cls.tag = Tag.objects.create(name="Завтрак", color="#E26C2D",
+                                     slug="breakfast")
+        cls.pancakes = Recipe.objects.create(
+            name="Блины", text="Тонкие блины на молоке.",
+            cooking_time=30, author=cls.author)
+        cls.pancakes.tags.add(cls.tag)
+        cls.porridge = Recipe.objects.create(
+            name="Каша", text="Овсяная каша с ёжевикой и блинами на гарнир.",
+            cooking_time=10, author=cls.author)
+        cls.soup = Recipe.objects.create(
+            name="Суп", text="Суп из курицы.",
+            cooking_time=60, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_ranks_name_above_text(self):
+        """
+        Проверяем, что совпадение в названии ранжируется выше,
+        чем совпадение в описании.
+        """
+        results = self._search(search="блин")
+        self.assertEqual([data["id"] for data in results],
+                         [self.pancakes.id, self.porridge.id],
+                         "Проверьте, что поиск упорядочен по релевантности.")
+        self.assertIn("<mark>", results[1]["search_headline"],
+                      "Проверьте, что в выдаче подсвечены совпадения.")
+
+    def test_headline_is_escaped(self):
+        """
+        Проверяем, что текст рецепта в подсветке экранируется,
+        а тэгами остаются только выделения совпадений.
+        """
+        Recipe.objects.create(
+            name="Торт", text="Торт <script>alert(1)</script> & крем.",
+            cooking_time=90, author=self.author)
+        headline = self._search(search="крем")[0]["search_headline"]
+        self.assertNotIn("<script>", headline,
+                         "Проверьте, что текст рецепта экранируется.")
+        self.assertIn("&amp;", headline)
+        self.assertIn("<mark>крем</mark>", headline,
+                      "Проверьте, что совпадения выделены.")
+
+    def test_search_rejects_cursor_pagination(self):
+        """
+        Проверяем, что поиск с пагинацией по ключу отклоняется,
+        а не теряет сортировку по релевантности.
+        """
+        response = self.client.get(reverse("routers:recipes-list"),
+                                   {"search": "блин", "cursor": ""})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_composes_with_filters(self):
+        """Проверяем, что поиск сочетается с фильтром по тэгам."""
+        results = self._search(search="блин", tags="breakfast")
+        self.assertEqual([data["id"] for data in results],
+                         [self.pancakes.id])
+
+    def test_search_index_follows_updates(self):
+        """
+        Проверяем, что поисковый индекс обновляется при изменении
+        и удалении рецепта.
+        """
+        self.soup.name = "Борщ"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.save()
+        self.assertEqual([data["id"] for data in self._search(search="борщ")],
+                         [self.soup.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.delete()
+        self.assertEqual(self._search(search="борщ"), [])
+
+    def _search(self, **params):
+        """Возвращает результаты поиска."""
+        response = self.client.get(reverse("routers:recipes-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
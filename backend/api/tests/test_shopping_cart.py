@@ -1,13 +1,23 @@
+import csv
+import io
+import json
 import shutil
 import tempfile
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
 
 from api.tests.service import StandartTest
-from food.models import Recipe, ShoppingCart
+from food.models import (Ingredient, IngredientForRecipe, Recipe,
+                         ShoppingCart, ShoppingCartTotal, Tag)
 from users.models import User
 
 MEDIA_ROOT = tempfile.mkdtemp()
@@ -89,3 +99,305 @@ class ShoppingCartTest(StandartTest):
         """Проверяет, что эндпойнт что-либо возвращает."""
         self.assertIsInstance(data, dict,
                               "Проверьте, что эндпойнт что-либо возвращает.")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DownloadShoppingCartTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.user)
+        sugar = Ingredient.objects.create(name="сахар",
+                                          measurement_unit="г")
+        milk = Ingredient.objects.create(name="молоко",
+                                         measurement_unit="мл")
+        apple = Ingredient.objects.create(name="яблоко",
+                                          measurement_unit="шт")
+        for amounts in ({sugar: 100, milk: 200}, {sugar: 50, apple: 3}):
+            recipe = Recipe.objects.create(
+                name="test_recipe",
+                image=SimpleUploadedFile('small.gif',
+                                         SMALL_GIF,
+                                         content_type='image/gif'),
+                text="text",
+                cooking_time=1,
+                author=cls.user
+            )
+            IngredientForRecipe.objects.bulk_create(
+                IngredientForRecipe(recipe=recipe, ingredient=ingredient,
+                                    amount=amount)
+                for ingredient, amount in amounts.items())
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.url = reverse("routers:recipes-download-shopping-cart")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _download(self, format=None):
+        data = {"format": format} if format else {}
+        response = self.client.get(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         "Проверьте, что список покупок выгружается.")
+        self.assertTrue(response.streaming,
+                        "Проверьте, что список покупок отдается потоком.")
+        return response, b''.join(response.streaming_content)
+
+    def test_download_requires_auth(self):
+        """Проверяем, что аноним не может выгрузить список покупок."""
+        self.client.credentials()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code,
+                         status.HTTP_401_UNAUTHORIZED,
+                         "Проверьте, что список покупок доступен только " +
+                         "авторизованному пользователю.")
+
+    def test_download_errors_are_json(self):
+        """Проверяем, что ошибки выгрузки отдаются в JSON."""
+        self.client.credentials()
+        for params, headers in (({'format': 'txt'}, {}),
+                                ({}, {'HTTP_ACCEPT': 'text/csv'})):
+            with self.subTest(params=params, headers=headers):
+                response = self.client.get(self.url, params, **headers)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_401_UNAUTHORIZED)
+                self.assertTrue(
+                    response['Content-Type'].startswith('application/json'),
+                    "Проверьте, что ошибки выгрузки списка покупок " +
+                    "отдаются с типом application/json.")
+                self.assertIn('detail', json.loads(response.content))
+
+    def test_download_txt(self):
+        """Проверяем текстовый список покупок: суммы и порядок строк."""
+        for format in (None, "txt"):
+            response, content = self._download(format)
+            self.assertEqual(response["Content-Type"],
+                             "text/plain; charset=utf-8")
+            self.assertEqual(response["Content-Disposition"],
+                             "attachment; filename=shop_list.txt")
+            self.assertEqual(
+                content.decode(),
+                "Список покупок: \n\n"
+                "- молоко (мл) - 200\n"
+                "- сахар (г) - 150\n"
+                "- яблоко (шт) - 3\n",
+                "Проверьте, что ингредиенты суммируются и " +
+                "сортируются по названию.")
+
+    def test_download_csv(self):
+        """Проверяем список покупок в формате CSV."""
+        response, content = self._download("csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows, [
+            ["Ингредиент", "Единица измерения", "Количество"],
+            ["молоко", "мл", "200"],
+            ["сахар", "г", "150"],
+            ["яблоко", "шт", "3"],
+        ])
+
+    def test_download_json(self):
+        """Проверяем список покупок в формате JSON."""
+        response, content = self._download("json")
+        self.assertEqual(response["Content-Type"],
+                         "application/json; charset=utf-8")
+        self.assertEqual(json.loads(content), [
+            {"name": "молоко", "measurement_unit": "мл", "amount": 200},
+            {"name": "сахар", "measurement_unit": "г", "amount": 150},
+            {"name": "яблоко", "measurement_unit": "шт", "amount": 3},
+        ])
+
+    def test_download_empty_json(self):
+        """Проверяем, что пустая корзина выгружается пустым массивом."""
+        ShoppingCart.objects.all().delete()
+        response, content = self._download("json")
+        self.assertEqual(json.loads(content), [])
+
+    def test_download_pdf(self):
+        """Проверяем список покупок в формате PDF."""
+        response, content = self._download("pdf")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Content-Disposition"],
+                         "attachment; filename=shop_list.pdf")
+        self.assertTrue(content.startswith(b"%PDF"))
+        self.assertIn(b"%%EOF", content[-32:])
+
+    def test_download_unknown_format(self):
+        """Проверяем, что неизвестный формат не поддерживается."""
+        response = self.client.get(self.url, {"format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ShoppingCartTotalTest(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="test@test.com",
+            username="testuser",
+            password="HelloWorldSecurePassword"
+            )
+        cls.token, cls.created = Token.objects.get_or_create(user=cls.user)
+        cls.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        cls.sugar = Ingredient.objects.create(name="сахар",
+                                              measurement_unit="г")
+        cls.milk = Ingredient.objects.create(name="молоко",
+                                             measurement_unit="мл")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.first = self._create_recipe({self.sugar: 100, self.milk: 200})
+        self.second = self._create_recipe({self.sugar: 50})
+
+    def _create_recipe(self, amounts):
+        recipe = Recipe.objects.create(
+            name="test_recipe",
+            image=SimpleUploadedFile('small.gif',
+                                     SMALL_GIF,
+                                     content_type='image/gif'),
+            text="text",
+            cooking_time=1,
+            author=self.user
+        )
+        recipe.tags.set([self.tag])
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(recipe=recipe, ingredient=ingredient,
+                                amount=amount)
+            for ingredient, amount in amounts.items())
+        return recipe
+
+    def _add(self, recipe):
+        response = self.client.post(
+            reverse("routers:recipes-shopping-cart", args=[recipe.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def _totals(self):
+        return {
+            (ingredient, amount, count)
+            for ingredient, amount, count in
+            ShoppingCartTotal.objects.filter(user=self.user).values_list(
+                "ingredient__name", "total_amount", "recipe_count")
+        }
+
+    def test_totals_follow_shopping_cart(self):
+        """Проверяем, что суммы меняются вместе со списком покупок."""
+        self._add(self.first)
+        self._add(self.second)
+        self.assertEqual(self._totals(),
+                         {("сахар", 150, 2), ("молоко", 200, 1)},
+                         "Проверьте, что суммы увеличиваются при " +
+                         "добавлении рецепта в список покупок.")
+        self.client.delete(
+            reverse("routers:recipes-shopping-cart", args=[self.first.id]))
+        self.assertEqual(self._totals(), {("сахар", 50, 1)},
+                         "Проверьте, что суммы уменьшаются при удалении " +
+                         "рецепта из списка покупок.")
+        self.second.delete()
+        self.assertEqual(self._totals(), set(),
+                         "Проверьте, что суммы уменьшаются при удалении " +
+                         "рецепта из базы.")
+
+    def test_totals_follow_recipe_ingredients(self):
+        """Проверяем, что суммы меняются вместе с составом рецепта."""
+        self._add(self.first)
+        self._add(self.second)
+        response = self.client.patch(
+            reverse("routers:recipes-detail", args=[self.first.id]),
+            {"tags": [self.tag.id],
+             "ingredients": [{"id": self.sugar.id, "amount": 10}]},
+            format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._totals(), {("сахар", 60, 2)},
+                         "Проверьте, что суммы пересчитываются при " +
+                         "изменении ингредиентов рецепта.")
+        IngredientForRecipe.objects.create(recipe=self.second,
+                                           ingredient=self.milk, amount=5)
+        self.assertEqual(self._totals(),
+                         {("сахар", 60, 2), ("молоко", 5, 1)})
+        IngredientForRecipe.objects.filter(recipe=self.second,
+                                           ingredient=self.sugar).delete()
+        self.assertEqual(self._totals(),
+                         {("сахар", 10, 1), ("молоко", 5, 1)})
+
+    def test_recipe_changes_do_not_depend_on_carts(self):
+        """
+        Проверяем, что изменение и удаление рецепта меняют суммы всех
+        списков покупок запросами к суммам, число которых не зависит
+        от числа списков.
+        """
+        def change_recipe(recipe):
+            with CaptureQueriesContext(connection) as queries:
+                amount = IngredientForRecipe.objects.get(
+                    recipe=recipe, ingredient=self.sugar)
+                amount.amount = 1
+                amount.save()
+                IngredientForRecipe.objects.create(
+                    recipe=recipe, ingredient=salt, amount=7)
+                recipe.delete()
+            return len([query for query in queries.captured_queries
+                        if "food_shoppingcarttotal" in query["sql"]])
+
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        users = [User.objects.create_user(email=f"user{number}@test.com",
+                                          username=f"user{number}",
+                                          password="HelloWorldSecurePassword")
+                 for number in range(3)]
+        ShoppingCart.objects.create(user=users[0], recipe=self.first)
+        ShoppingCart.objects.create(user=users[0], recipe=self.second)
+        single = change_recipe(self.second)
+        for user in users[1:]:
+            ShoppingCart.objects.create(user=user, recipe=self.first)
+        ShoppingCart.objects.create(user=self.user, recipe=self.first)
+        self.assertEqual(change_recipe(self.first), single,
+                         "Проверьте, что суммы меняются одним запросом " +
+                         "для всех списков покупок.")
+        self.assertFalse(ShoppingCartTotal.objects.exists(),
+                         "Проверьте, что суммы удаленного рецепта " +
+                         "вычитаются из всех списков покупок.")
+
+    def test_shopping_cart_summary(self):
+        """Проверяем эндпойнт сумм списка покупок."""
+        self._add(self.first)
+        self._add(self.second)
+        url = reverse("routers:recipes-shopping-cart-summary")
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [
+            {"id": self.milk.id, "name": "молоко", "measurement_unit": "мл",
+             "total_amount": 200, "recipe_count": 1},
+            {"id": self.sugar.id, "name": "сахар", "measurement_unit": "г",
+             "total_amount": 150, "recipe_count": 2},
+        ])
+        self.client.credentials()
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_reconcile_command(self):
+        """Проверяем сверку сумм с полным пересчетом."""
+        self._add(self.first)
+        self._add(self.second)
+        call_command("reconcile_shopping_totals", stdout=io.StringIO())
+        ShoppingCartTotal.objects.filter(ingredient=self.sugar).update(
+            total_amount=1)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_shopping_totals", stdout=io.StringIO())
+        call_command("reconcile_shopping_totals", "--fix",
+                     stdout=io.StringIO())
+        self.assertEqual(self._totals(),
+                         {("сахар", 150, 2), ("молоко", 200, 1)})
@@ -3,7 +3,7 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
-from users.models import User
+from users.models import Follow, User
 
 FIRST_RESULT = 0
 
@@ -43,6 +43,32 @@ class UserTest(APITestCase):
         self._assert_serializer_is_correct(
             response.data.get("results")[FIRST_RESULT])
 
+    def test_users_list_query_count(self):
+        """
+        Проверяет, что подписки на пользователей страницы достаются
+        одним запросом, независимо от размера страницы.
+        """
+        url = reverse("routers:user-list")
+        authors = [
+            User.objects.create_user(email=f"author{number}@test.com",
+                                     username=f"author{number}",
+                                     password="HelloWorldSecurePassword")
+            for number in range(5)
+        ]
+        Follow.objects.create(user=UserTest.user, author=authors[0])
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Token {UserTest.token.key}")
+        with self.assertNumQueries(4) as context:
+            self.client.get(url, {"limit": 2})
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(url, {"limit": 6})
+        subscribed = {user["id"]: user["is_subscribed"]
+                      for user in response.data["results"]}
+        self.assertEqual(subscribed,
+                         {user.id: user == authors[0]
+                          for user in [UserTest.user, *authors]},
+                         "Проверьте значение is_subscribed в списке.")
+
     def test_get_user_by_id(self):
         """
         Проверяет эндпойнт получения пользователя по ID.
@@ -1,22 +1,32 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, response, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from api.filters import IngredientFilter, RecipeFilter
+from api.mixins import (AnonymousCacheMixin, CatalogMixin,
+                        ConditionalGetMixin, IngredientSearchMixin)
 from api.pagination import CustomPagination
+from api.parsers import MultiPartJSONParser
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
                              RecipeCreateUpdateSerializer,
-                             RecipeReadSerializer, ShoppingCartSerializer,
-                             TagSerializer)
+                             RecipeDocumentSerializer, RecipeIdsSerializer,
+                             ShoppingCartSerializer,
+                             ShoppingCartTotalSerializer, TagSerializer)
 from food.models import Favorite, Recipe, ShoppingCart
 from services import ingredient as ingr
 from services import model as m
-from services import recipe, tag
+from services import shopping_cart as sc
+from services import cache, recipe, tag
+from services.catalog import ingredients_catalog, tags_catalog
 
 SERIALIZERS_MODEL = {
     Favorite: FavoriteSerializer,
@@ -24,17 +34,20 @@ SERIALIZERS_MODEL = {
 }
 
 
-class TagViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                 viewsets.GenericViewSet):
+class TagViewSet(ConditionalGetMixin, CatalogMixin, mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """Вьюсет для отображения тэгов."""
     queryset = tag.get_all_tags()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    condition_generations = (cache.TAGS,)
+    catalog = tags_catalog
 
 
-class IngridientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                        viewsets.GenericViewSet):
+class IngridientViewSet(ConditionalGetMixin, IngredientSearchMixin,
+                        CatalogMixin, mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """Вьюсет отображения ингридиентов."""
     queryset = ingr.get_all_ingredients()
     serializer_class = IngredientSerializer
@@ -42,92 +55,172 @@ class IngridientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     pagination_class = None
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     filterset_class = IngredientFilter
+    condition_generations = (cache.INGREDIENTS,)
+    catalog = ingredients_catalog
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет отображения рецептов."""
     queryset = recipe.get_all_recipes()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    lookup_value_regex = r'\d+'
+    condition_generations = (cache.RECIPES,)
+    condition_per_user = True
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return recipe.get_recipes_for_read(self.request.user)
+        return super().get_queryset()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_count_signature(self):
+        """Возвращает нормализованную сигнатуру фильтров списка рецептов."""
+        if self.action != 'list':
+            return None
+        params = self.request.query_params
+        signature = {
+            'generation': cache.get_generation(cache.RECIPES),
+            'tags': sorted(set(params.getlist('tags'))),
+            'tags_match': params.get('tags_match'),
+            'author': params.get('author'),
+            'is_favorited': params.get('is_favorited'),
+            'is_in_shopping_cart': params.get('is_in_shopping_cart'),
+            'search': params.get('search'),
+        }
+        user = self.request.user
+        if user.is_authenticated and (signature['is_favorited']
+                                      or signature['is_in_shopping_cart']):
+            signature['user'] = user.pk
+            signature['user_generation'] = cache.get_generation(
+                cache.user_state(user.pk))
+        return signature
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
-            return RecipeReadSerializer
+            return RecipeDocumentSerializer
         return RecipeCreateUpdateSerializer
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Ошибки выгрузки списка покупок отдаются в JSON, как и весь API."""
+        if (self.action == 'download_shopping_cart'
+                and getattr(response, 'exception', False)):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
     @action(detail=True,
             methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-
         if request.method == "POST":
+            recipe = get_object_or_404(Recipe, id=pk)
             return self._create_to(ShoppingCart, recipe, request)
-        return self._delete_from(ShoppingCart, recipe, request)
+        return self._delete_from(ShoppingCart, int(pk), request)
+
+    @action(detail=False,
+            methods=['get'],
+            url_path='shopping_cart',
+            url_name='shopping-cart-summary',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        """Отдает суммы ингредиентов по всем рецептам в списке покупок."""
+        totals = sc.get_totals(request.user).select_related('ingredient')
+        serializer = ShoppingCartTotalSerializer(totals, many=True)
+        return Response(serializer.data)
+
+    @shopping_cart_summary.mapping.post
+    @shopping_cart_summary.mapping.delete
+    def shopping_cart_bulk(self, request):
+        """Добавляет или удаляет из списка покупок несколько рецептов."""
+        return self._bulk_change(ShoppingCart, request)
 
     @action(detail=True,
             methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-
         if request.method == "POST":
+            recipe = get_object_or_404(Recipe, id=pk)
             return self._create_to(Favorite, recipe, request)
-        return self._delete_from(Favorite, recipe, request)
+        return self._delete_from(Favorite, int(pk), request)
 
     @action(detail=False,
-            methods=['GET'],
+            methods=['post', 'delete'],
+            url_path='favorite',
+            url_name='favorite-bulk',
             permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
+    def favorite_bulk(self, request):
+        """Добавляет или удаляет из избранного несколько рецептов."""
+        return self._bulk_change(Favorite, request)
 
-        ingredients = ingr.get_sum_amount(user=request.user)
-
-        shopping_list = (
-            'Список покупок: \n\n'
-        )
-        for ingredient in ingredients:
-            shopping_list += (
-                f'- {ingredient["ingredient__name"]} '
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f' - {ingredient["total_amount"]}'
-            ) + '\n'
-
-        name = 'shop_list.txt'
-        response = HttpResponse(shopping_list,
-                                content_type='text/plain')
+    @action(detail=False,
+            methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
+    def download_shopping_cart(self, request):
+        """
+        Отдает список покупок потоком. Формат выбирается параметром
+        ?format=txt|csv|json|pdf или заголовком Accept, по умолчанию txt.
+        """
+        renderer = request.accepted_renderer
+        ingredients = ingr.get_sum_amount(user=request.user).iterator(
+            chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(renderer.stream(ingredients),
+                                         content_type=content_type)
+        name = f'shop_list.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={name}'
-
         return response
 
     def _create_to(self, model, recipe, request):
-        """Создает модель, предварительно прогнав через сериализатор."""
-        if m.is_exists(request.user, recipe, model):
+        """Добавляет рецепт одним запросом, опираясь на ограничение БД."""
+        if not m.create(request.user, recipe, model):
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        serializer = self._validate_data(model, request, recipe)
-        m.create(request.user, recipe, model)
+        serializer = SERIALIZERS_MODEL[model](recipe,
+                                              context={'request': request})
         return response.Response(serializer.data,
                                  status=status.HTTP_201_CREATED)
 
-    def _delete_from(self, model, recipe, request):
-        """Удаляет модель, предварительно прогнав через сериализатор."""
-        if not m.is_exists(request.user, recipe, model):
+    def _delete_from(self, model, pk, request):
+        """Удаляет рецепт одним запросом, опираясь на ограничение БД."""
+        if not m.delete(request.user, pk, model):
+            get_object_or_404(Recipe, id=pk)
             return Response({'errors': 'Рецепт уже удален!'},
                             status=status.HTTP_400_BAD_REQUEST)
-
-        self._validate_data(model, request, recipe)
-        m.delete(request.user, recipe, model)
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
-    def _validate_data(self, model, request, recipe):
-        serializer = SERIALIZERS_MODEL[model](
-            recipe,
-            data=request.data,
-            context={"request": request})
+    def _bulk_change(self, model, request):
+        """
+        Применяет массовое добавление или удаление и возвращает
+        результат для каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        return serializer
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            changed, unchanged, missing = m.bulk_create(
+                request.user, recipe_ids, model)
+            outcomes = ('added', 'already_added')
+        else:
+            changed, unchanged, missing = m.bulk_delete(
+                request.user, recipe_ids, model)
+            outcomes = ('removed', 'not_added')
+        results = []
+        for pk in dict.fromkeys(recipe_ids):
+            if pk in changed:
+                outcome = outcomes[0]
+            elif pk in unchanged:
+                outcome = outcomes[1]
+            else:
+                outcome = 'not_found'
+            results.append({'id': pk, 'status': outcome})
+        return Response({'results': results})
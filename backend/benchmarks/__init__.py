@@ -0,0 +1,49 @@
+"""
+Бенчмарки запускаются из каталога backend как модули, например:
+
+    python -m benchmarks.tag_filter --recipes 1000000
+
+Каждый бенчмарк работает в отдельной тестовой базе данных,
+которая создается по настройкам проекта и удаляется после запуска.
+"""
+import os
+import time
+from contextlib import contextmanager
+from statistics import median
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import (setup_test_environment,  # noqa: E402
+                               teardown_test_environment)
+
+
+@contextmanager
+def benchmark_database():
+    """Создает тестовую базу данных на время бенчмарка."""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    """Возвращает медианное время выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return median(timings)
+
+
+def report(name, milliseconds):
+    """Выводит строку результата бенчмарка."""
+    print(f'{name:<48} {milliseconds:>10.2f} ms')
@@ -0,0 +1,130 @@
+"""
+Сравнивает загрузку картинки рецепта base64-строкой в JSON
+и отдельным файлом в multipart/form-data: время обработки запроса
+и пиковый объем памяти, выделенной Python, для картинки около 5 МБ.
+Обработка картинки после фиксации транзакции не измеряется.
+
+    python -m benchmarks.image_upload --size 5
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from statistics import median
+from unittest import mock
+
+from benchmarks import benchmark_database, measure, report
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from food.models import Ingredient, Tag
+from users.models import User
+
+URL = '/api/recipes/'
+
+
+def make_image(size_mb):
+    """Возвращает JPEG из шума размером не меньше size_mb мегабайт."""
+    width = 512
+    while True:
+        height = width * 3 // 4
+        image = Image.frombytes('RGB', (width, height),
+                                os.urandom(width * height * 3))
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=95)
+        if output.tell() >= size_mb * 1024 * 1024:
+            return output.getvalue()
+        width += width // 4
+
+
+def populate():
+    user = User.objects.create_user(email='bench@bench.com',
+                                    username='bench',
+                                    password='bench')
+    tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+    ingredient = Ingredient.objects.create(name='сахар',
+                                           measurement_unit='г')
+    return user, {
+        'name': 'recipe',
+        'text': 'text',
+        'cooking_time': 1,
+        'tags': [tag.id],
+        'ingredients': [{'id': ingredient.id, 'amount': 1}],
+    }
+
+
+def json_request(factory, data, content):
+    image = 'data:image/jpeg;base64,' + base64.b64encode(content).decode()
+    return factory.post(URL, json.dumps({**data, 'image': image}),
+                        content_type='application/json')
+
+
+def multipart_request(factory, data, content):
+    return factory.post(URL, {
+        'data': json.dumps(data),
+        'image': SimpleUploadedFile('photo.jpg', content,
+                                    content_type='image/jpeg'),
+    }, format='multipart')
+
+
+def upload(view, user, build_request):
+    """Отправляет заранее собранный запрос и проверяет ответ."""
+    request = build_request()
+    force_authenticate(request, user=user)
+
+    def run():
+        response = view(request)
+        assert response.status_code == 201, response.data
+    return run
+
+
+def peak_memory(func):
+    """Возвращает пиковый объем памяти, выделенной func, в килобайтах."""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=float, default=5,
+                        help='Размер картинки, МБ.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = make_image(args.size)
+    print(f'Картинка {len(content) / 1024 / 1024:.2f} МБ')
+    factory = APIRequestFactory()
+    view = RecipeViewSet.as_view({'post': 'create'})
+    with benchmark_database(), tempfile.TemporaryDirectory() as media, \
+            override_settings(MEDIA_ROOT=media), \
+            mock.patch('services.images.submit'):
+        user, data = populate()
+        cases = (
+            ('base64 in JSON', json_request),
+            ('multipart/form-data', multipart_request),
+        )
+        for name, build in cases:
+            timings = []
+            for _ in range(args.repeat):
+                # Тело запроса собирается до замера: его передает клиент.
+                timings.append(measure(
+                    upload(view, user, lambda: build(factory, data, content)),
+                    repeat=1))
+            report(f'{name}: time', median(timings))
+            memory = peak_memory(
+                upload(view, user, lambda: build(factory, data, content)))
+            print(f'{name + ": peak memory":<48} {memory:>10.2f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Сравнивает прежнюю выгрузку списка покупок (GROUP BY по рецептам
+корзины и одна строка, собираемая через +=) с потоковой выгрузкой
+готовых сумм во всех форматах для корзины из 1000 рецептов.
+
+    python -m benchmarks.shopping_cart --recipes 1000 --ingredients 2000
+"""
+import argparse
+import random
+import tracemalloc
+
+from benchmarks import benchmark_database, measure, report
+
+from django.conf import settings
+from django.db.models import Sum
+
+from api.renderers import SHOPPING_LIST_RENDERERS
+from food.models import Ingredient, IngredientForRecipe, Recipe, ShoppingCart
+from services import ingredient as ingr
+from services import shopping_cart as sc
+from users.models import User
+
+PER_RECIPE = 10
+
+
+def populate(recipes_count, ingredients_count):
+    """Заполняет корзину пользователя рецептами со случайным составом."""
+    user = User.objects.create_user(email='bench@bench.com',
+                                    username='bench',
+                                    password='bench')
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(ingredients_count))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=user, name=f'recipe_{number}', text='text',
+               cooking_time=1)
+        for number in range(recipes_count))
+    randomizer = random.Random(0)
+    IngredientForRecipe.objects.bulk_create(
+        IngredientForRecipe(recipe=recipe, ingredient=ingredient,
+                            amount=randomizer.randint(1, 500))
+        for recipe in recipes
+        for ingredient in randomizer.sample(ingredients, PER_RECIPE))
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes)
+    sc.rebuild_totals([user.pk])
+    return user
+
+
+def concatenate(user):
+    """Прежняя выгрузка: весь список собирается в одну строку."""
+    ingredients = IngredientForRecipe.objects.filter(
+        recipe__shoppingcart__user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(total_amount=Sum('amount'))
+    shopping_list = 'Список покупок: \n\n'
+    for ingredient in ingredients:
+        shopping_list += (
+            f'- {ingredient["ingredient__name"]} '
+            f'({ingredient["ingredient__measurement_unit"]})'
+            f' - {ingredient["total_amount"]}'
+        ) + '\n'
+    return shopping_list.encode()
+
+
+def stream(renderer, user):
+    """Потоковая выгрузка: части документа отдаются клиенту по одной."""
+    ingredients = ingr.get_sum_amount(user=user).iterator(
+        chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+    size = 0
+    for chunk in renderer.stream(ingredients):
+        size += len(chunk)
+    return size
+
+
+def peak_memory(func):
+    """Возвращает пиковый объем памяти, выделенной func, в килобайтах."""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user = populate(args.recipes, args.ingredients)
+        print(f'{args.recipes} рецептов в корзине, '
+              f'{PER_RECIPE} ингредиентов в каждом')
+        cases = [('group by, concatenation, txt', lambda: concatenate(user))]
+        for renderer_class in SHOPPING_LIST_RENDERERS:
+            renderer = renderer_class()
+            cases.append((f'stream, {renderer.format}',
+                          lambda renderer=renderer: stream(renderer, user)))
+        for name, func in cases:
+            report(f'{name}: time', measure(func, args.repeat))
+            print(f'{name + ": peak memory":<48} '
+                  f'{peak_memory(func):>10.2f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Сравнивает фильтрацию рецептов по тэгам через таблицу связей
+и через маску тэгов рецепта.
+
+    python -m benchmarks.tag_filter --recipes 1000000 --tags 10
+"""
+import argparse
+import random
+
+from benchmarks import benchmark_database, measure, report
+
+from django.db.models import F
+
+from food.models import Recipe, Tag
+from services import tag
+from users.models import User
+
+BATCH_SIZE = 10000
+PAGE_SIZE = 6
+
+
+def populate(recipes_count, tags_count):
+    """Заполняет базу рецептами со случайными наборами тэгов."""
+    author = User.objects.create_user(email='bench@bench.com',
+                                      username='bench',
+                                      password='bench')
+    Tag.objects.bulk_create(
+        Tag(name=f'tag_{number}', slug=f'tag_{number}')
+        for number in range(tags_count))
+    tags = list(Tag.objects.order_by('id'))
+    Through = Recipe.tags.through
+    randomizer = random.Random(0)
+    for start in range(0, recipes_count, BATCH_SIZE):
+        size = min(BATCH_SIZE, recipes_count - start)
+        chosen = [randomizer.sample(tags, randomizer.randint(1, 3))
+                  for _ in range(size)]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'recipe_{start + number}',
+                   text='text', cooking_time=1,
+                   tags_mask=sum(1 << (tag.id - 1)
+                                 for tag in chosen[number]))
+            for number in range(size))
+        Through.objects.bulk_create(
+            Through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe, recipe_tags in zip(recipes, chosen)
+            for tag in recipe_tags)
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--tags', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        tags = populate(args.recipes, args.tags)
+        selected = tags[:2]
+        slugs = [tag.slug for tag in selected]
+        mask = sum(1 << (tag.id - 1) for tag in selected)
+        recipes = Recipe.objects.all()
+
+        join_any = recipes.filter(tags__slug__in=slugs)
+        join_any_distinct = join_any.distinct()
+        join_all = recipes.filter(tags__slug=slugs[0]).filter(
+            tags__slug=slugs[1])
+        masked = recipes.alias(tags_bits=F('tags_mask').bitand(mask))
+        mask_any = masked.filter(tags_bits__gt=0)
+        mask_all = masked.filter(tags_bits=mask)
+        masks_any = recipes.filter(
+            tags_mask__in=tag.get_matching_masks(mask, False))
+        masks_all = recipes.filter(
+            tags_mask__in=tag.get_matching_masks(mask, True))
+
+        print(f'{args.recipes} рецептов, {args.tags} тэгов, '
+              f'фильтр по {len(slugs)} тэгам')
+        for name, queryset in (
+                ('join, any (with duplicates)', join_any),
+                ('join, any, distinct', join_any_distinct),
+                ('join, all', join_all),
+                ('mask, any', mask_any),
+                ('mask, all', mask_all),
+                ('mask list, any', masks_any),
+                ('mask list, all', masks_all)):
+            report(f'{name}: count',
+                   measure(queryset.count, args.repeat))
+            report(f'{name}: first page',
+                   measure(lambda: list(queryset[:PAGE_SIZE]), args.repeat))
+            report(f'{name}: page 1000',
+                   measure(lambda: list(
+                       queryset[PAGE_SIZE * 999:PAGE_SIZE * 1000]),
+                       args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Сравнивает прежнюю загрузку ингредиентов (get_or_create на каждую
+строку CSV) с пакетной загрузкой командой upload_data: первую загрузку
+каталога из 1 000 000 строк и повторную, когда все строки уже есть.
+Прежний способ измеряется на --legacy-rows первых строках.
+
+    python -m benchmarks.upload_data --rows 1000000
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+
+from benchmarks import benchmark_database, measure, report
+
+from django.core.management import call_command
+
+from food.models import Ingredient
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def write_catalog(path, rows):
+    """Пишет CSV с rows уникальными ингредиентами."""
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('name', ' measurement_unit'))
+        for number in range(rows):
+            writer.writerow((f'ингредиент {number}',
+                             UNITS[number % len(UNITS)]))
+
+
+def legacy_upload(path, rows):
+    """Прежняя загрузка: get_or_create на каждую строку."""
+    with open(path, encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for _, row in zip(range(rows), reader):
+            Ingredient.objects.get_or_create(
+                name=row['name'],
+                measurement_unit=row[' measurement_unit'])
+
+
+def upload(path):
+    call_command('upload_data', path, stdout=io.StringIO())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--legacy-rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    with benchmark_database(), tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ingredients.csv')
+        write_catalog(path, args.rows)
+        report(f'get_or_create: {args.legacy_rows} rows',
+               measure(lambda: legacy_upload(path, args.legacy_rows),
+                       repeat=1))
+        Ingredient.objects.all().delete()
+        report(f'upload_data: {args.rows} rows, empty table',
+               measure(lambda: upload(path), repeat=1))
+        assert Ingredient.objects.count() == args.rows
+        report(f'upload_data: {args.rows} rows, all exist',
+               measure(lambda: upload(path), repeat=1))
+
+
+if __name__ == '__main__':
+    main()
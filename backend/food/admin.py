@@ -22,5 +22,6 @@ class IngridientForRecipeInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ["author", "name", "text", "cooking_time"]
+    list_display = ["author", "name", "text", "cooking_time",
+                    "favorites_count", "in_carts_count"]
     inlines = [IngridientForRecipeInline]
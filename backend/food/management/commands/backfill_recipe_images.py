@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from services import images
+from services import recipe as rec
+
+CHUNK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает порциями картинки рецептов без уменьшенных '
+            'копий: поворот, уменьшение, копии для карточек и BlurHash. '
+            'Картинки обрабатываются в пуле процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Кол-во процессов; 0 - обрабатывать '
+                                 'в текущем процессе.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во картинок в одной порции.')
+        parser.add_argument('--all', action='store_true',
+                            help='Обработать заново и картинки, у которых '
+                                 'уже есть уменьшенные копии.')
+
+    def handle(self, *args, **options):
+        recipes = rec.get_all_recipes().exclude(image='').exclude(
+            image__isnull=True).order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        workers = options['workers']
+        if workers:
+            # Процессы не должны унаследовать открытые соединения с БД.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=django.setup) as pool:
+                self.backfill(recipes, options['chunk_size'], pool.map)
+        else:
+            self.backfill(recipes, options['chunk_size'], map)
+
+    def backfill(self, recipes, chunk_size, map_function):
+        """
+        Обрабатывает картинки порциями по первичному ключу: файлы
+        готовятся в map_function, подмена в БД идет в текущем процессе.
+        """
+        last_pk, processed, failed = 0, 0, 0
+        while True:
+            chunk = list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', 'image')[:chunk_size])
+            if not chunk:
+                break
+            prepared = map_function(images.prepare,
+                                    [name for _, name in chunk])
+            with rec.deferred_documents():
+                for (pk, name), result in zip(chunk, prepared):
+                    if result is None:
+                        failed += 1
+                    elif images.swap(pk, name, result):
+                        processed += 1
+            last_pk = chunk[-1][0]
+            self.stdout.write(f'Обработано картинок: {processed}, '
+                              f'с ошибками: {failed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, обработано картинок: {processed}, '
+            f'с ошибками: {failed}'))
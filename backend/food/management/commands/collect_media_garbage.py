@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services import media
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Удаляет порциями файлы картинок, на которые больше '
+            'не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Кол-во файлов в одной транзакции.')
+        parser.add_argument('--grace-period', type=int,
+                            default=settings.MEDIA_GC_GRACE_PERIOD,
+                            help='Удалять файлы, освобожденные больше '
+                                 'стольких секунд назад.')
+
+    def handle(self, *args, **options):
+        deleted = media.collect_garbage(options['batch_size'],
+                                        options['grace_period'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, удалено файлов: {deleted}'))
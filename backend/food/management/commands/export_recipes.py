@@ -0,0 +1,79 @@
+import base64
+import json
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from food.models import IngredientForRecipe, Recipe, Tag
+from services import recipe as rec
+
+CHUNK_SIZE = 500
+
+
+def build_record(recipe: Recipe, inline_images: bool) -> dict:
+    """
+    Возвращает рецепт в виде, не зависящем от id в базе: автор,
+    тэги и ингредиенты описаны своими уникальными полями.
+    """
+    author = recipe.author
+    record = {
+        'id': recipe.pk,
+        'author': {'email': author.email,
+                   'username': author.username,
+                   'first_name': author.first_name,
+                   'last_name': author.last_name},
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': [{'name': tag.name, 'color': tag.color, 'slug': tag.slug}
+                 for tag in recipe.tags.all()],
+        'ingredients': [
+            {'name': amount.ingredient.name,
+             'measurement_unit': amount.ingredient.measurement_unit,
+             'amount': amount.amount}
+            for amount in recipe.ingredientforrecipe_set.all()],
+        'image': recipe.image.name or None,
+    }
+    if inline_images and recipe.image:
+        storage = recipe.image.storage
+        if storage.exists(recipe.image.name):
+            with storage.open(recipe.image.name) as image:
+                record['image_content'] = base64.b64encode(
+                    image.read()).decode()
+    return record
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в файл JSON Lines, по рецепту в строке. '
+            'Рецепты читаются порциями через серверный курсор, поэтому '
+            'расход памяти не зависит от кол-ва рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для выгрузки.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во рецептов в одной порции.')
+        parser.add_argument('--inline-images', action='store_true',
+                            help='Вложить картинки в файл в base64, '
+                                 'а не только их имена в хранилище.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipes = rec.get_all_recipes().select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+            Prefetch('ingredientforrecipe_set',
+                     queryset=IngredientForRecipe.objects.select_related(
+                         'ingredient').order_by('pk'))
+        ).order_by('pk')
+        exported = 0
+        with open(options['path'], 'w', encoding='utf-8') as file:
+            for recipe in recipes.iterator(chunk_size=chunk_size):
+                file.write(json.dumps(
+                    build_record(recipe, options['inline_images']),
+                    ensure_ascii=False) + '\n')
+                exported += 1
+                if exported % chunk_size == 0:
+                    self.stdout.write(f'Выгружено рецептов: {exported}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, выгружено рецептов: {exported}'))
@@ -0,0 +1,248 @@
+import base64
+import json
+import os
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from food.models import Ingredient, IngredientForRecipe, Recipe, Tag
+from services import cache, counters, media
+from services import recipe as rec
+from services import search
+from users.models import User
+
+CHUNK_SIZE = 500
+
+
+def read_records(file):
+    """Построчно читает рецепты, возвращая номер строки и рецепт."""
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Строка {number}: {error}.')
+        if not isinstance(record, dict) or 'id' not in record:
+            raise CommandError(f'Строка {number}: нет id рецепта.')
+        yield number, record
+
+
+def load_id_map(path, chunk_size) -> dict:
+    """
+    Читает соответствие id рецептов из файла в id в базе. Строки
+    пишутся до фиксации порции, поэтому рецепты, которых нет в базе
+    (порция откатилась или рецепт удален), из соответствия убираются
+    и будут загружены заново.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    id_map = {}
+    for start in range(0, len(entries), chunk_size):
+        chunk = entries[start:start + chunk_size]
+        existing = set(Recipe.objects.filter(
+            pk__in=[entry['id'] for entry in chunk]
+        ).values_list('pk', flat=True))
+        id_map.update((entry['source'], entry['id']) for entry in chunk
+                      if entry['id'] in existing)
+    if len(id_map) != len(entries):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            for source, target in id_map.items():
+                file.write(json.dumps({'source': source, 'id': target})
+                           + '\n')
+        os.replace(temporary, path)
+    return id_map
+
+
+def get_or_create_all(model, objects, key_fields):
+    """
+    Возвращает id объектов model по значениям key_fields, создавая
+    недостающие одним bulk_create, и признак, что объекты создавались.
+    """
+    objects = {tuple(getattr(obj, field) for field in key_fields): obj
+               for obj in objects}
+
+    def find():
+        rows = model.objects.filter(**{
+            f'{key_fields[0]}__in': {key[0] for key in objects}
+        }).values_list('pk', *key_fields)
+        return {tuple(row[1:]): row[0] for row in rows
+                if tuple(row[1:]) in objects}
+
+    ids = find()
+    missing = [obj for key, obj in objects.items() if key not in ids]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        ids = find()
+    return ids, bool(missing)
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из файла JSON Lines, выгруженного '
+            'export_recipes. Рецепты добавляются порциями, каждая '
+            'в своей транзакции; недостающие авторы, тэги '
+            'и ингредиенты создаются. Соответствие id из файла id '
+            'в базе пишется в файл --id-map, и повторный запуск '
+            'продолжает загрузку после последней удачной порции. '
+            'Уменьшенные копии картинок строит backfill_recipe_images.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с рецептами.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во рецептов в одной транзакции.')
+        parser.add_argument('--id-map',
+                            help='Файл соответствия id, по умолчанию '
+                                 '<path>.ids.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        id_map_path = options['id_map'] or f'{options["path"]}.ids'
+        id_map = load_id_map(id_map_path, chunk_size)
+        if id_map:
+            self.stdout.write(f'Уже загружено рецептов: {len(id_map)}')
+        imported, self.missing_images = 0, 0
+        with open(options['path'], encoding='utf-8') as file, \
+                open(id_map_path, 'a', encoding='utf-8') as id_map_file:
+            records = ((number, record)
+                       for number, record in read_records(file)
+                       if record['id'] not in id_map)
+            while chunk := list(islice(records, chunk_size)):
+                chunk = list({record['id']: (number, record)
+                              for number, record in chunk}.values())
+                with transaction.atomic():
+                    ids = self.import_chunk(chunk)
+                    for (_, record), pk in zip(chunk, ids):
+                        id_map[record['id']] = pk
+                        id_map_file.write(json.dumps(
+                            {'source': record['id'], 'id': pk}) + '\n')
+                    id_map_file.flush()
+                    os.fsync(id_map_file.fileno())
+                imported += len(ids)
+                self.stdout.write(f'Загружено рецептов: {imported}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, загружено рецептов: {imported}, '
+            f'не найдено картинок: {self.missing_images}'))
+
+    def import_chunk(self, chunk) -> list:
+        """
+        Добавляет порцию рецептов и обновляет их производные данные,
+        которые bulk_create не трогает: маски тэгов, поисковый индекс,
+        представления, счетчики авторов и ссылки на картинки.
+        """
+        try:
+            authors = self.get_authors(record['author']
+                                       for _, record in chunk)
+            tags = self.get_tags(tag for _, record in chunk
+                                 for tag in record['tags'])
+            ingredients = self.get_ingredients(
+                ingredient for _, record in chunk
+                for ingredient in record['ingredients'])
+            recipes = [Recipe(author_id=authors[record['author']['email']],
+                              name=record['name'],
+                              text=record['text'],
+                              cooking_time=record['cooking_time'],
+                              image=self.get_image(record))
+                       for _, record in chunk]
+        except (KeyError, TypeError) as error:
+            raise CommandError(f'Строки {chunk[0][0]}-{chunk[-1][0]}: '
+                               f'нет поля или неверный формат ({error}).')
+        Recipe.objects.bulk_create(recipes)
+        ids = [recipe.pk for recipe in recipes]
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            through(recipe_id=pk, tag_id=tag_id)
+            for pk, (_, record) in zip(ids, chunk)
+            for tag_id in dict.fromkeys(tags[tag['slug']]
+                                        for tag in record['tags']))
+        amounts = []
+        for pk, (_, record) in zip(ids, chunk):
+            by_ingredient = {}
+            for ingredient in record['ingredients']:
+                ingredient_id = ingredients[(ingredient['name'],
+                                             ingredient['measurement_unit'])]
+                by_ingredient[ingredient_id] = (
+                    by_ingredient.get(ingredient_id, 0)
+                    + ingredient['amount'])
+            amounts.extend(
+                IngredientForRecipe(recipe_id=pk, ingredient_id=key,
+                                    amount=amount)
+                for key, amount in by_ingredient.items())
+        IngredientForRecipe.objects.bulk_create(amounts)
+
+        rec.update_tags_masks(ids)
+        search.update_search_index(ids)
+        rec.rebuild_documents(Recipe.objects.filter(pk__in=ids))
+        counters.change(User, 'recipes_count',
+                        [recipe.author_id for recipe in recipes], 1)
+        media.acquire(recipe.image.name for recipe in recipes)
+        cache.bump_on_commit(cache.RECIPES)
+        return ids
+
+    def get_authors(self, authors) -> dict:
+        """
+        Возвращает id авторов по email. Недостающие создаются без
+        пароля: войти они смогут после сброса пароля.
+        """
+        users = []
+        for author in authors:
+            user = User(email=author['email'], username=author['username'],
+                        first_name=author['first_name'],
+                        last_name=author['last_name'])
+            user.set_unusable_password()
+            users.append(user)
+        ids, _ = get_or_create_all(User, users, ('email',))
+        missing = {user.email for user in users} - {key for key, in ids}
+        if missing:
+            raise CommandError('Не удалось создать авторов, их псевдонимы '
+                               'заняты: ' + ', '.join(sorted(missing)))
+        return {key: pk for (key,), pk in ids.items()}
+
+    def get_tags(self, tags) -> dict:
+        """Возвращает id тэгов по slug, создавая недостающие."""
+        tags = [Tag(name=tag['name'], color=tag['color'], slug=tag['slug'])
+                for tag in tags]
+        ids, created = get_or_create_all(Tag, tags, ('slug',))
+        missing = {tag.slug for tag in tags} - {key for key, in ids}
+        if missing:
+            raise CommandError('Не удалось создать тэги, их названия '
+                               'заняты: ' + ', '.join(sorted(missing)))
+        if created:
+            cache.bump_on_commit(cache.TAGS)
+        return {key: pk for (key,), pk in ids.items()}
+
+    def get_ingredients(self, ingredients) -> dict:
+        """
+        Возвращает id ингредиентов по названию и единице измерения,
+        создавая недостающие.
+        """
+        ids, created = get_or_create_all(
+            Ingredient,
+            [Ingredient(name=ingredient['name'],
+                        measurement_unit=ingredient['measurement_unit'])
+             for ingredient in ingredients],
+            ('name', 'measurement_unit'))
+        if created:
+            cache.bump_on_commit(cache.INGREDIENTS)
+        return ids
+
+    def get_image(self, record):
+        """
+        Сохраняет вложенную картинку в хранилище или проверяет, что
+        картинка с таким именем в нем уже есть. Возвращает ее имя.
+        """
+        name = record.get('image')
+        if not name:
+            return None
+        storage = Recipe.image.field.storage
+        content = record.get('image_content')
+        if content:
+            return storage.save(name, ContentFile(base64.b64decode(content)))
+        if storage.exists(name):
+            return name
+        self.missing_images += 1
+        return None
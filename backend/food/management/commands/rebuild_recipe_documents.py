@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from services import recipe as rec
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает готовые представления рецептов порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во рецептов в одной транзакции.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipes = rec.get_all_recipes().order_by('pk')
+        last_pk, total = 0, 0
+        while True:
+            pks = list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                total += rec.rebuild_documents(
+                    rec.get_all_recipes().filter(pk__in=pks))
+            last_pk = pks[-1]
+            self.stdout.write(f'Пересобрано представлений: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, пересобрано представлений: {total}'))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from food.models import ShoppingCartTotal
+from services import shopping_cart as sc
+from users.models import User
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Сверяет суммы ингредиентов в списках покупок с полным '
+            'пересчетом и, с флагом --fix, исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во пользователей в одной проверке.')
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересчитать суммы с расхождениями.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        users = User.objects.order_by('pk')
+        last_pk, checked, broken = 0, 0, []
+        while True:
+            pks = list(users.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                mismatched = self.find_mismatches(pks)
+                if options['fix']:
+                    sc.rebuild_totals(mismatched)
+            broken.extend(mismatched)
+            checked += len(pks)
+            last_pk = pks[-1]
+            self.stdout.write(f'Проверено пользователей: {checked}, '
+                              f'с расхождениями: {len(broken)}')
+        if broken and not options['fix']:
+            raise CommandError(
+                'Суммы расходятся с пересчетом у пользователей: '
+                + ', '.join(map(str, broken)))
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, исправлено пользователей: {len(broken)}'
+            if broken else 'Готово, расхождений нет'))
+
+    def find_mismatches(self, user_ids):
+        """Возвращает пользователей, чьи суммы отличаются от пересчета."""
+        expected = {
+            (row['recipe__shoppingcart__user_id'], row['ingredient_id']):
+                (row['total'], row['recipes'])
+            for row in sc.compute_totals(user_ids).iterator()
+        }
+        actual = {
+            (user_id, ingredient_id): (total, recipes)
+            for user_id, ingredient_id, total, recipes
+            in ShoppingCartTotal.objects.filter(
+                user_id__in=user_ids
+            ).values_list('user_id', 'ingredient_id',
+                          'total_amount', 'recipe_count').iterator()
+        }
+        return sorted({
+            user_id for user_id, ingredient_id in expected.keys() | actual
+            if expected.get((user_id, ingredient_id))
+            != actual.get((user_id, ingredient_id))
+        })
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food.models import Recipe
+from services import counters
+from users.models import User
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает порциями счетчики пользователей и рецептов, '
+            'разошедшиеся с данными.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Кол-во объектов в одной транзакции.')
+
+    def handle(self, *args, **options):
+        for model in (User, Recipe):
+            repaired = self.repair(model, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'исправлено счетчиков у {repaired}'))
+
+    def repair(self, model, chunk_size):
+        """Пересчитывает счетчики модели порциями по первичному ключу."""
+        objects = model.objects.order_by('pk')
+        last_pk, checked, repaired = 0, 0, 0
+        while True:
+            pks = list(objects.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                repaired += counters.repair(model, pks)
+            checked += len(pks)
+            last_pk = pks[-1]
+            self.stdout.write(f'{model._meta.verbose_name_plural}: '
+                              f'проверено {checked}, исправлено {repaired}')
+        return repaired
@@ -1,25 +1,189 @@
 import csv
+import json
+import re
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from food.models import Ingredient
 from foodgram.settings import BASE_DIR
+from services import cache
 
+BATCH_SIZE = 5000
+COLUMNS = ('name', 'measurement_unit')
+FORMATS = ('csv', 'json')
+# Размер куска файла, который читается из JSON за раз.
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+STAGING_TABLE = 'food_ingredient_staging'
 
-def upload_ingridients():
-    """Загружает ингридиенты в БД."""
-    with open(BASE_DIR / 'data/ingredients.csv',
-              encoding='utf-8') as csv_file:
-        csv_reader = csv.DictReader(csv_file, delimiter=',')
 
-        for row in csv_reader:
-            Ingredient.objects.get_or_create(
-                name=row['name'],
-                measurement_unit=row[' measurement_unit']
-            )
+def read_csv(file):
+    """Построчно читает ингредиенты из CSV с заголовком."""
+    reader = csv.reader(file)
+    header = [column.strip() for column in next(reader, [])]
+    try:
+        indexes = [header.index(column) for column in COLUMNS]
+    except ValueError:
+        raise CommandError(f'В заголовке CSV нет колонок {COLUMNS}.')
+    for row in reader:
+        if row:
+            yield tuple(row[index].strip() for index in indexes)
+
+
+def read_json(file):
+    """
+    Читает ингредиенты из JSON-массива объектов по одному, не загружая
+    весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON должен быть массивом объектов.')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('JSON оборван или поврежден.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        try:
+            yield tuple(str(item[column]).strip() for column in COLUMNS)
+        except (KeyError, TypeError):
+            raise CommandError(f'Ожидался объект с полями {COLUMNS}.')
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+MAX_LENGTHS = [Ingredient._meta.get_field(column).max_length
+               for column in COLUMNS]
+
+
+def is_valid(row) -> bool:
+    """Проверяет, что значения непустые и помещаются в поля модели."""
+    return all(value and len(value) <= max_length
+               for value, max_length in zip(row, MAX_LENGTHS))
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для COPY FROM STDIN: отдает строки
+    в текстовом формате PostgreSQL по мере чтения.
+    """
+    ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t',
+                             '\n': '\\n', '\r': '\\r'})
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += '\t'.join(
+                value.translate(self.ESCAPES) for value in row) + '\n'
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON порциями в одной '
+            'транзакции. Уже существующие ингредиенты пропускаются, '
+            'поэтому загрузку можно повторять. В PostgreSQL файл '
+            'копируется COPY во временную таблицу и сливается '
+            'одним запросом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            default=BASE_DIR / 'data/ingredients.csv',
+                            help='Файл с ингредиентами, по умолчанию '
+                                 'data/ingredients.csv.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Формат файла, по умолчанию '
+                                 'по расширению.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Кол-во строк между отчетами '
+                                 'о прогрессе и в одном INSERT.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}.')
+        self.read_rows, self.skipped = 0, 0
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = self.track(READERS[file_format](file),
+                              options['batch_size'])
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    created = self.copy(rows)
+                else:
+                    created = self.insert(rows, options['batch_size'])
+        if created:
+            cache.bump_generation(cache.INGREDIENTS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, прочитано строк: {self.read_rows}, '
+            f'добавлено ингредиентов: {created}, '
+            f'пропущено некорректных: {self.skipped}'))
+
+    def track(self, rows, batch_size):
+        """Отбрасывает некорректные строки и сообщает о прогрессе."""
+        for row in rows:
+            self.read_rows += 1
+            if is_valid(row):
+                yield row
+            else:
+                self.skipped += 1
+            if self.read_rows % batch_size == 0:
+                self.stdout.write(f'Прочитано строк: {self.read_rows}')
+
+    def insert(self, rows, batch_size) -> int:
+        """Добавляет ингредиенты порциями, пропуская существующие."""
+        before = Ingredient.objects.count()
+        for batch in batched(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True)
+        return Ingredient.objects.count() - before
 
-    def handle(self, *args, **kwargs):
-        upload_ingridients()
+    def copy(self, rows) -> int:
+        """
+        Копирует строки во временную таблицу и переносит новые
+        ингредиенты одним INSERT ... SELECT.
+        """
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            # Таблица остается до конца внешней транзакции, если
+            # команда вызвана внутри нее.
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                f'(name text, measurement_unit text) ON COMMIT DROP')
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (name, measurement_unit) '
+                f'FROM STDIN', CopyStream(rows))
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit '
+                f'FROM {STAGING_TABLE} '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0003_rename_colour_tag_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='food.recipe')),
+                ('data', models.JSONField(verbose_name='Данные')),
+            ],
+            options={
+                'verbose_name': 'Представление рецепта',
+                'verbose_name_plural': 'Представления рецептов',
+            },
+        ),
+    ]
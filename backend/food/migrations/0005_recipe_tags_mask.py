@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+MASK_BITS = 63
+
+
+def fill_tags_masks(apps, schema_editor):
+    Recipe = apps.get_model('food', 'Recipe')
+    masks = {}
+    relations = Recipe.tags.through.objects.filter(
+        tag_id__lte=MASK_BITS).values_list('recipe_id', 'tag_id')
+    for recipe_id, tag_id in relations.iterator():
+        masks[recipe_id] = masks.get(recipe_id, 0) | 1 << (tag_id - 1)
+    for recipe_id, mask in masks.items():
+        Recipe.objects.filter(pk=recipe_id).update(tags_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0004_recipedocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Маска тэгов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:25
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(model, link):
+    counts = model.objects.filter(
+        **{link: models.OuterRef('pk')}
+    ).order_by().values(link).annotate(
+        count=models.Count('pk')).values('count')
+    return Coalesce(models.Subquery(counts), models.Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('food', 'Recipe')
+    Favorite = apps.get_model('food', 'Favorite')
+    ShoppingCart = apps.get_model('food', 'ShoppingCart')
+    User.objects.update(recipes_count=count(Recipe, 'author'),
+                        followers_count=count(Follow, 'author'))
+    Recipe.objects.update(favorites_count=count(Favorite, 'recipe'),
+                          in_carts_count=count(ShoppingCart, 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0007_shoppingcarttotal'),
+        ('users', '0010_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
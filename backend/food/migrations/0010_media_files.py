@@ -0,0 +1,55 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:42
+
+from collections import Counter
+
+from django.db import migrations, models
+import food.storage
+
+BATCH_SIZE = 1000
+VARIANT_FORMATS = ('webp', 'jpeg')
+
+
+def fill_media_files(apps, schema_editor):
+    Recipe = apps.get_model('food', 'Recipe')
+    MediaFile = apps.get_model('food', 'MediaFile')
+    references = Counter()
+    recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+    for image, variants in recipes.values_list(
+            'image', 'image_variants').iterator():
+        references[image] += 1
+        for variant in variants.values():
+            references.update(value for key, value in variant.items()
+                              if key in VARIANT_FORMATS)
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=count)
+         for name, count in references.items()),
+        batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Кол-во ссылок')),
+                ('released_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Время освобождения')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default=None, null=True, storage=food.storage.ContentAddressedStorage(), upload_to='media/recipes/images'),
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:50
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Сливает одинаковые ингредиенты в один с наименьшим id: ссылки
+    рецептов переносятся на него, количества совпавших ссылок
+    складываются. Суммы в списках покупок затронутых рецептов
+    пересчитываются, а их представления удаляются - рецепты читаются
+    по таблицам до пересборки командой rebuild_recipe_documents.
+    """
+    Ingredient = apps.get_model('food', 'Ingredient')
+    IngredientForRecipe = apps.get_model('food', 'IngredientForRecipe')
+    ShoppingCart = apps.get_model('food', 'ShoppingCart')
+    ShoppingCartTotal = apps.get_model('food', 'ShoppingCartTotal')
+    RecipeDocument = apps.get_model('food', 'RecipeDocument')
+    groups = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1)
+    recipe_ids = set()
+    for group in list(groups):
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep']).values_list('pk', flat=True))
+        for link in IngredientForRecipe.objects.filter(
+                ingredient_id__in=duplicates):
+            kept, created = IngredientForRecipe.objects.get_or_create(
+                recipe_id=link.recipe_id, ingredient_id=group['keep'],
+                defaults={'amount': link.amount})
+            if not created:
+                kept.amount += link.amount
+                kept.save(update_fields=['amount'])
+            link.delete()
+            recipe_ids.add(link.recipe_id)
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+    if not recipe_ids:
+        return
+    RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+    user_ids = set(ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids).values_list('user_id', flat=True))
+    ShoppingCartTotal.objects.filter(user_id__in=user_ids).delete()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(user_id=row['recipe__shoppingcart__user_id'],
+                          ingredient_id=row['ingredient_id'],
+                          total_amount=row['total'],
+                          recipe_count=row['recipes'])
+        for row in IngredientForRecipe.objects.filter(
+            recipe__shoppingcart__user_id__in=user_ids
+        ).values(
+            'recipe__shoppingcart__user_id', 'ingredient_id'
+        ).annotate(
+            total=Sum('amount'), recipes=Count('recipe_id')
+        ).order_by())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0010_media_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
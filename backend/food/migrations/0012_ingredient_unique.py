@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Ограничение добавляется отдельной миграцией: в PostgreSQL таблицу
+    нельзя менять в той же транзакции, где удаление дубликатов оставило
+    отложенные проверки внешних ключей.
+    """
+
+    dependencies = [
+        ('food', '0011_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique ingredient'),
+        ),
+    ]
@@ -2,9 +2,11 @@ import re
 
 from django.core.validators import RegexValidator
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
-from users.models import User
+from food.storage import ContentAddressedStorage
+from users.models import CountersMixin, User
 
 
 class Ingredient(models.Model):
@@ -17,6 +19,10 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Игридиент'
         verbose_name_plural = 'Игридиенты'
+        constraints = [models.UniqueConstraint(
+            fields=('name', 'measurement_unit'),
+            name='unique ingredient'
+        )]
 
     def __str__(self):
         return f"{self.name} в {self.measurement_unit}"
@@ -55,7 +61,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Рецепт."""
     author = models.ForeignKey(
         verbose_name='Автор публикации',
@@ -79,8 +85,38 @@ class Recipe(models.Model):
         related_name='tags')
     image = models.ImageField(
         upload_to='media/recipes/images',
+        storage=ContentAddressedStorage(),
         null=True,
         default=None)
+    image_variants = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False)
+    image_placeholder = models.CharField(
+        'BlurHash картинки',
+        max_length=64,
+        blank=True,
+        editable=False)
+    tags_mask = models.BigIntegerField(
+        'Маска тэгов',
+        default=0,
+        db_index=True,
+        editable=False)
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'Кол-во добавлений в избранное',
+        default=0,
+        editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'Кол-во добавлений в список покупок',
+        default=0,
+        editable=False)
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-id',)
@@ -145,3 +181,59 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.user} хочет купить {self.recipe}"
+
+
+class ShoppingCartTotal(models.Model):
+    """Сумма ингредиента по всем рецептам в списке покупок пользователя."""
+    user = models.ForeignKey(to=User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_totals')
+    ingredient = models.ForeignKey(to=Ingredient,
+                                   on_delete=models.CASCADE)
+    total_amount = models.PositiveBigIntegerField('Общее количество')
+    recipe_count = models.PositiveIntegerField('Кол-во рецептов')
+
+    class Meta:
+        verbose_name = 'Сумма в списке покупок'
+        verbose_name_plural = 'Суммы в списках покупок'
+        constraints = [models.UniqueConstraint(
+            fields=('user', 'ingredient'),
+            name='unique shopping cart total'
+        )]
+
+    def __str__(self):
+        return f"{self.ingredient} в списке покупок {self.user}"
+
+
+class RecipeDocument(models.Model):
+    """Готовое представление рецепта для чтения."""
+    recipe = models.OneToOneField(to=Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='document')
+    data = models.JSONField('Данные')
+
+    class Meta:
+        verbose_name = 'Представление рецепта'
+        verbose_name_plural = 'Представления рецептов'
+
+    def __str__(self):
+        return f"Представление {self.recipe}"
+
+
+class MediaFile(models.Model):
+    """Файл картинки в хранилище и кол-во ссылок на него из рецептов."""
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Кол-во ссылок', default=0)
+    released_at = models.DateTimeField(
+        'Время освобождения',
+        null=True,
+        blank=True,
+        db_index=True)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,266 @@
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from food.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                         ShoppingCart, Tag)
+from services import cache, counters, media
+from services import recipe as rec
+from services import search
+from services import shopping_cart as sc
+from users.models import User
+
+AUTHOR_DOCUMENT_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+IMAGE_FIELDS = {'image', 'image_variants'}
+
+
+def get_origin_model(origin):
+    """Возвращает модель, с удаления которой началось каскадное удаление."""
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(post_save, sender=IngredientForRecipe)
+@receiver(post_delete, sender=IngredientForRecipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def recipes_changed(**kwargs):
+    """Делает устаревшими закэшированные данные о рецептах."""
+    cache.bump_on_commit(cache.RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(**kwargs):
+    """Делает устаревшими закэшированные данные о тэгах."""
+    cache.bump_on_commit(cache.TAGS)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(**kwargs):
+    """Делает устаревшими закэшированные данные об ингредиентах."""
+    cache.bump_on_commit(cache.INGREDIENTS)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def user_state_changed(instance, **kwargs):
+    """Делает устаревшими закэшированные данные пользователя."""
+    cache.bump_on_commit(cache.user_state(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_counted(instance, signal, created=False, **kwargs):
+    """Меняет счетчик рецептов автора."""
+    delta = counters.get_delta(signal, created)
+    if delta:
+        counters.change(User, 'recipes_count', [instance.author_id], delta)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_counted(instance, signal, created=False, **kwargs):
+    """Меняет счетчик добавлений рецепта в избранное."""
+    delta = counters.get_delta(signal, created)
+    if delta:
+        counters.change(Recipe, 'favorites_count', [instance.recipe_id], delta)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_counted(instance, signal, created=False, **kwargs):
+    """Меняет счетчик добавлений рецепта в списки покупок."""
+    delta = counters.get_delta(signal, created)
+    if delta:
+        counters.change(Recipe, 'in_carts_count', [instance.recipe_id], delta)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    """Пересобирает представление сохраненного рецепта."""
+    rec.schedule_documents([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_saved(instance, update_fields, **kwargs):
+    """Обновляет поисковый индекс сохраненного рецепта."""
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    search.update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(instance, **kwargs):
+    """Удаляет рецепт из поискового индекса."""
+    search.delete_from_search_index([instance.pk])
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(instance, update_fields, **kwargs):
+    """
+    Запоминает файлы картинки рецепта до сохранения, если картинка
+    заменяется новым файлом или удаляется. Имя файла вместо загрузки
+    присваивать нельзя: такая замена не учитывается в ссылках.
+    """
+    image = instance.image
+    if (instance._state.adding or (image and image._committed)
+            or (update_fields and not IMAGE_FIELDS & set(update_fields))):
+        instance.stored_files = None
+        return
+    instance.stored_files = media.get_stored_files(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_media_saved(instance, created, **kwargs):
+    """Переносит ссылки со старых файлов картинки рецепта на новые."""
+    stored_files = getattr(instance, 'stored_files', None)
+    if created or stored_files is not None:
+        media.replace(stored_files or [], media.get_recipe_files(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_media_deleted(instance, **kwargs):
+    """Освобождает файлы картинки удаленного рецепта."""
+    media.release(media.get_recipe_files(instance))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    """
+    Пересчитывает маски тэгов и пересобирает представления рецептов
+    после изменения их тэгов.
+    """
+    if reverse and action == 'pre_clear':
+        instance.recipe_ids = list(instance.tags.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, 'recipe_ids', [])
+    else:
+        recipe_ids = pk_set
+    rec.update_tags_masks(recipe_ids)
+    rec.schedule_documents(recipe_ids)
+
+
+@receiver(pre_save, sender=IngredientForRecipe)
+def recipe_ingredient_saving(instance, **kwargs):
+    """Запоминает прежние ингредиент и количество изменяемой связи."""
+    instance.previous = None
+    if not instance._state.adding:
+        instance.previous = IngredientForRecipe.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientForRecipe)
+def recipe_ingredient_saved(instance, **kwargs):
+    """
+    Пересобирает представление рецепта и меняет суммы списков покупок
+    на разницу с прежним ингредиентом.
+    """
+    rec.schedule_documents([instance.recipe_id])
+    deltas = {instance.ingredient_id: (instance.amount, 1)}
+    previous = getattr(instance, 'previous', None)
+    if previous is not None:
+        ingredient_id, amount = previous
+        sc.merge_deltas(deltas, {ingredient_id: (-amount, -1)})
+    sc.schedule_totals(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=IngredientForRecipe)
+def recipe_ingredient_deleted(instance, origin, **kwargs):
+    """
+    Пересобирает представление рецепта после удаления ингредиента,
+    если сам рецепт не удаляется вместе с ним. Суммы списков покупок
+    меняются, только если удаляется сама связь: при удалении
+    ингредиента его суммы удаляются каскадно.
+    """
+    model = get_origin_model(origin)
+    if model in (IngredientForRecipe, Ingredient):
+        rec.schedule_documents([instance.recipe_id])
+    if model is IngredientForRecipe:
+        sc.schedule_totals(instance.recipe_id,
+                           {instance.ingredient_id: (-instance.amount, -1)})
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    """
+    Вычитает ингредиенты удаляемого рецепта из сумм всех списков
+    покупок, где он есть, одним изменением, а не по строке списка.
+    """
+    sc.change_recipe_totals(instance.pk,
+                            sc.get_recipe_deltas(instance.pk, -1))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(instance, created, **kwargs):
+    """Прибавляет ингредиенты рецепта к суммам списка покупок."""
+    if created:
+        sc.add_to_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleting(instance, origin, **kwargs):
+    """
+    Вычитает ингредиенты рецепта из сумм списка покупок. При удалении
+    рецепта, в том числе вместе с автором, суммы уже уменьшены
+    в recipe_deleting, а суммы удаляемого пользователя удаляются
+    каскадно.
+    """
+    if get_origin_model(origin) not in (User, Recipe):
+        sc.remove_from_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(instance, created, **kwargs):
+    """Пересобирает представления рецептов с измененным тэгом."""
+    if not created:
+        rec.schedule_documents(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(instance, **kwargs):
+    """Запоминает рецепты удаляемого тэга."""
+    instance.recipe_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(instance, **kwargs):
+    """
+    Пересчитывает маски тэгов и пересобирает представления рецептов
+    удаленного тэга.
+    """
+    recipe_ids = getattr(instance, 'recipe_ids', [])
+    rec.update_tags_masks(recipe_ids)
+    rec.schedule_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    """Пересобирает представления рецептов с измененным ингредиентом."""
+    if not created:
+        rec.schedule_documents(IngredientForRecipe.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_saved(instance, created, update_fields, **kwargs):
+    """Пересобирает представления рецептов измененного автора."""
+    if created or (update_fields
+                   and not AUTHOR_DOCUMENT_FIELDS & set(update_fields)):
+        return
+    cache.bump_on_commit(cache.RECIPES)
+    rec.schedule_documents(
+        rec.filter_by_author(instance).values_list('pk', flat=True))
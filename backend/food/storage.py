@@ -0,0 +1,69 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Одно расширение на формат, чтобы одинаковые файлы совпадали по имени.
+EXTENSION_ALIASES = {'.jpeg': '.jpg', '.jpe': '.jpg', '.tif': '.tiff'}
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - sha256 его содержимого.
+    Одинаковые файлы хранятся один раз, а файл по имени никогда
+    не меняется, поэтому его можно кэшировать навсегда. Удаляет
+    ненужные файлы сборщик мусора по счетчику ссылок (services.media).
+    """
+
+    def get_content_name(self, name, content) -> str:
+        """Возвращает имя, под которым будет сохранено содержимое."""
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        ext = os.path.splitext(name)[1].lower()
+        ext = EXTENSION_ALIASES.get(ext, ext)
+        return posixpath.join(directory, digest.hexdigest() + ext)
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name) and self.touch(name):
+            return name
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        """Файл с тем же именем уже содержит то же самое."""
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def touch(self, name):
+        """
+        Обновляет время изменения файла, чтобы сборщик мусора не удалил
+        файл, только что загруженный заново. Возвращает False, если
+        файл уже удален.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def modified_after(self, name, moment) -> bool:
+        """Проверяет, менялся ли файл после moment."""
+        try:
+            return self.get_modified_time(name) > moment
+        except FileNotFoundError:
+            return False
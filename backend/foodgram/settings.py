@@ -74,6 +74,27 @@ DATABASES = {
     }
 }
 
+# Тестовая SQLite-база в памяти не ждет снятия блокировок, и тесты
+# одновременных запросов с ней не работают, поэтому она хранится в файле.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['TEST'] = {
+        'NAME': os.getenv('DB_TEST_NAME',
+                          default=str(BASE_DIR / 'test_db.sqlite3')),
+    }
+
+# Кэш должен быть общим для всех процессов: через поколения в нем
+# воркеры и команды manage.py узнают об изменениях друг друга.
+# LocMemCache подходит только для тестов и локального запуска.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              default='redis://redis:6379/0'),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -102,6 +123,49 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Максимальное кол-во рецептов в одном массовом запросе к избранному
+# и списку покупок.
+BULK_RECIPES_LIMIT = 1000
+# Размер порции строк, читаемых из БД при выгрузке списка покупок.
+SHOPPING_LIST_CHUNK_SIZE = 2000
+# Шрифт с кириллицей для списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+# Размер PDF, до которого он собирается в памяти, а не во временном файле.
+SHOPPING_LIST_PDF_MAX_MEMORY = 1024 * 1024
+# Максимальный размер картинки рецепта после декодирования base64, в байтах.
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+# Загруженные файлы больше этого размера сохраняются во временные файлы
+# на диске, а не держатся в памяти.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+# Картинки рецептов уменьшаются до этого размера по большей стороне.
+RECIPE_IMAGE_MAX_DIMENSION = 1600
+# Качество JPEG и WebP при пересохранении картинок рецептов.
+RECIPE_IMAGE_QUALITY = 85
+# Уменьшенные копии картинок рецептов для карточек: имя -> размер
+# по большей стороне.
+RECIPE_IMAGE_VARIANTS = {'thumbnail': 160, 'card': 480}
+# Кол-во потоков обработки картинок и длина очереди к ним. При полной
+# очереди картинка обрабатывается в потоке запроса.
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_QUEUE_SIZE = 100
+# Сколько секунд файл картинки без ссылок хранится до удаления сборщиком
+# мусора: за это время его еще могут отдавать закэшированные ответы.
+MEDIA_GC_GRACE_PERIOD = 60 * 60 * 24
+# Обрабатывать картинки сразу после фиксации транзакции в том же
+# потоке, без пула; удобно в тестах.
+RECIPE_IMAGE_SYNC = os.getenv('RECIPE_IMAGE_SYNC', 'False') == 'True'
+# Максимальное кол-во ингредиентов в ответе на поиск по названию.
+INGREDIENT_SEARCH_LIMIT = 50
+# Время жизни закэшированных ответов для анонимных пользователей, в секундах.
+ANONYMOUS_CACHE_TIMEOUT = 60 * 10
+# Время жизни закэшированного числа объектов в пагинации, в секундах.
+PAGINATION_COUNT_CACHE_TIMEOUT = 60 * 5
+# Бюджет времени на точный подсчет, в миллисекундах. При превышении
+# используется оценка планировщика PostgreSQL. None - считать всегда точно.
+PAGINATION_COUNT_TIMEOUT = os.getenv('PAGINATION_COUNT_TIMEOUT', default=None)
+
 DJOSER = {
     'SERIALIZERS': {
         'user_create': 'api.serializers.CustomUserCreateSerializer',
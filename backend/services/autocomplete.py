@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left
+from typing import NamedTuple
+
+from food.models import Ingredient
+from services import cache
+
+
+def normalize(value: str) -> str:
+    """Приводит строку к виду для поиска: без регистра, ё как е."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IndexData(NamedTuple):
+    """
+    Собранный индекс. Заменяется целиком одним присваиванием, поэтому
+    читатели без блокировки не видят ключи одной сборки
+    и ингредиенты другой.
+    """
+    generation: int
+    keys: list
+    items: list
+
+
+class IngredientIndex:
+    """
+    Индекс поиска ингредиентов по названию в памяти процесса.
+    Строится при первом обращении и перестраивается, когда меняется
+    поколение данных ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def search(self, value: str, limit: int) -> list:
+        """
+        Возвращает не больше limit ингредиентов: сначала названия,
+        начинающиеся с value, затем содержащие его.
+        """
+        key = normalize(value.strip())
+        keys, items = self._get_index()
+        results = []
+        position = bisect_left(keys, key)
+        while (position < len(keys) and len(results) < limit
+               and keys[position].startswith(key)):
+            results.append(items[position])
+            position += 1
+        for name, item in zip(keys, items):
+            if len(results) >= limit:
+                break
+            if key in name and not name.startswith(key):
+                results.append(item)
+        return results
+
+    def _get_index(self):
+        generation = cache.get_generation(cache.INGREDIENTS)
+        data = self._data
+        if data is None or data.generation != generation:
+            with self._lock:
+                data = self._data
+                if data is None or data.generation != generation:
+                    data = self._data = self._build(generation)
+        return data.keys, data.items
+
+    def _build(self, generation: int) -> IndexData:
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'))
+        return IndexData(
+            generation=generation,
+            keys=[row[0] for row in rows],
+            items=[{'id': pk,
+                    'name': name,
+                    'measurement_unit': measurement_unit}
+                   for _, name, pk, measurement_unit in rows])
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,82 @@
+"""
+Кодирование картинки в BlurHash - короткую строку, по которой клиент
+рисует размытую заглушку, пока картинка не загрузилась.
+Алгоритм: https://github.com/woltapp/blurhash/blob/master/Algorithm.md
+"""
+import math
+
+from PIL import Image
+
+ALPHABET = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+            'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~')
+# Картинка уменьшается до этого размера: заглушке не нужны детали.
+SAMPLE_SIZE = 32
+
+
+def _encode83(value: int, length: int) -> str:
+    return ''.join(ALPHABET[value // 83 ** (length - i) % 83]
+                   for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value: int) -> float:
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _quantize_ac(value: float, maximum: float) -> int:
+    value = value / maximum
+    value = math.copysign(abs(value) ** 0.5, value)
+    return max(0, min(18, math.floor(value * 9 + 9.5)))
+
+
+def encode(image: Image.Image, x_components: int = 4,
+           y_components: int = 3) -> str:
+    """Возвращает BlurHash картинки."""
+    image = image.convert('RGB')
+    image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    width, height = image.size
+    linear = [_srgb_to_linear(value) for value in range(256)]
+    pixels = [(linear[r], linear[g], linear[b])
+              for r, g, b in image.getdata()]
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            normalization = 1 if i == j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pixel = pixels[y * width + x]
+                    r += basis * pixel[0]
+                    g += basis * pixel[1]
+                    b += basis * pixel[2]
+            scale = normalization / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        actual_maximum = max(abs(value) for factor in ac for value in factor)
+        quantized = max(0, min(82, math.floor(actual_maximum * 166 - 0.5)))
+        maximum = (quantized + 1) / 166
+    else:
+        quantized, maximum = 0, 1
+    result += _encode83(quantized, 1)
+    result += _encode83((_linear_to_srgb(dc[0]) << 16)
+                        + (_linear_to_srgb(dc[1]) << 8)
+                        + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (_quantize_ac(value, maximum) for value in factor)
+        result += _encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
@@ -0,0 +1,42 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+
+
+def user_state(user_id: int) -> str:
+    """Возвращает имя поколения избранного, покупок и подписок пользователя."""
+    return f'user:{user_id}'
+
+
+def get_generation(name: str) -> int:
+    """
+    Возвращает текущее поколение данных. Поколение - метка времени
+    последнего изменения, поэтому после вытеснения из кэша
+    старые ключи не оживают.
+    """
+    key = f'generation:{name}'
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name: str) -> None:
+    """Начинает новое поколение данных, делая устаревшими старые ключи."""
+    cache.set(f'generation:{name}', time.time_ns(), None)
+
+
+def bump_on_commit(name: str) -> None:
+    """
+    Начинает новое поколение после фиксации текущей транзакции. Если
+    сменить его раньше, параллельный читатель возьмет новое поколение,
+    соберет ответ по снимку до фиксации и закэширует старые данные
+    под новым ключом.
+    """
+    transaction.on_commit(lambda: bump_generation(name))
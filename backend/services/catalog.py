@@ -0,0 +1,55 @@
+import gzip
+import json
+import threading
+from typing import NamedTuple
+
+from food.models import Ingredient, Tag
+from services import cache
+
+
+class CatalogBlob(NamedTuple):
+    """Предрендеренный справочник."""
+    generation: int
+    identity: bytes
+    gzip: bytes
+
+
+class Catalog:
+    """
+    Справочник, хранящийся в памяти процесса в виде готового JSON,
+    сжатого и несжатого. Пересобирается, только когда меняется
+    поколение данных справочника.
+    """
+
+    def __init__(self, generation_name: str, fetch):
+        self.generation_name = generation_name
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._blob = None
+
+    def get(self) -> CatalogBlob:
+        """Возвращает актуальный предрендеренный справочник."""
+        generation = cache.get_generation(self.generation_name)
+        blob = self._blob
+        if blob is None or blob.generation != generation:
+            with self._lock:
+                blob = self._blob
+                if blob is None or blob.generation != generation:
+                    blob = self._blob = self._render(generation)
+        return blob
+
+    def _render(self, generation: int) -> CatalogBlob:
+        identity = json.dumps(self.fetch(), ensure_ascii=False,
+                              separators=(',', ':')).encode()
+        return CatalogBlob(generation=generation,
+                           identity=identity,
+                           gzip=gzip.compress(identity, mtime=0))
+
+
+tags_catalog = Catalog(
+    cache.TAGS,
+    lambda: list(Tag.objects.values('id', 'name', 'color', 'slug')))
+ingredients_catalog = Catalog(
+    cache.INGREDIENTS,
+    lambda: list(Ingredient.objects.values(
+        'id', 'name', 'measurement_unit')))
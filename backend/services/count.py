@@ -0,0 +1,37 @@
+from django.db import DatabaseError, connections, transaction
+from django.db.models import QuerySet
+
+
+def count(queryset: QuerySet, timeout: int = None) -> int:
+    """
+    Возвращает число объектов. Если точный подсчет не укладывается
+    в timeout миллисекунд, возвращает оценку планировщика PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    if not timeout or connection.vendor != 'postgresql':
+        return queryset.count()
+    try:
+        with transaction.atomic(using=queryset.db):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s',
+                               [int(timeout)])
+                result = queryset.count()
+                cursor.execute('SET LOCAL statement_timeout TO DEFAULT')
+                return result
+    except DatabaseError:
+        return estimate_count(queryset)
+
+
+def estimate_count(queryset: QuerySet) -> int:
+    """Возвращает оценку числа объектов по статистике PostgreSQL."""
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            return max(cursor.fetchone()[0], 0)
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,72 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+
+from food.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Модель -> счетчик -> (модель связи, поле связи со счетчиком).
+COUNTERS = {
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+    },
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+        'in_carts_count': (ShoppingCart, 'recipe'),
+    },
+}
+
+
+def change(model, field: str, pks, delta: int) -> None:
+    """
+    Меняет счетчик field у объектов pks на delta атомарно, выражением
+    F(). Если pk повторяется, счетчик меняется на delta за каждый раз.
+    Счетчик не опускается ниже нуля.
+    """
+    by_times = defaultdict(list)
+    for pk, times in Counter(pks).items():
+        by_times[times].append(pk)
+    for times, ids in by_times.items():
+        model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta * times, Value(0))})
+
+
+def get_delta(signal, created=False) -> int:
+    """
+    Возвращает изменение счетчика по сигналу о связи: +1 при создании,
+    -1 при удалении (в том числе каскадном) и 0 при обновлении.
+    """
+    if signal is post_delete:
+        return -1
+    return 1 if signal is post_save and created else 0
+
+
+def get_actual_counts(model):
+    """Возвращает выражения, считающие счетчики модели заново."""
+    counts = {}
+    for field, (related, link) in COUNTERS[model].items():
+        count = related.objects.filter(
+            **{link: OuterRef('pk')}
+        ).order_by().values(link).annotate(count=Count('pk')).values('count')
+        counts[field] = Coalesce(Subquery(count), Value(0))
+    return counts
+
+
+def repair(model, pks) -> int:
+    """
+    Пересчитывает счетчики объектов pks, разошедшиеся с данными,
+    и возвращает кол-во исправленных объектов.
+    """
+    counts = get_actual_counts(model)
+    actual = {f'actual_{field}': count for field, count in counts.items()}
+    drifted = Q()
+    for field in counts:
+        drifted |= ~Q(**{field: F(f'actual_{field}')})
+    stale = list(model.objects.filter(pk__in=pks).annotate(
+        **actual).filter(drifted).values_list('pk', flat=True))
+    if stale:
+        model.objects.filter(pk__in=stale).update(**counts)
+    return len(stale)
@@ -1,16 +1,46 @@
+from django.db import transaction
+
+from services import cache, counters, links
 from users.models import Follow, User
 
 
-def create_follow(user: User, author: User) -> Follow:
-    """Создает модель подписки."""
-    return Follow.objects.create(user=user, author=author)
+def _changed(user: User, author_id: int, delta: int) -> None:
+    """Обновляет производные данные после изменения подписки."""
+    counters.change(User, 'followers_count', [author_id], delta)
+    cache.bump_on_commit(cache.user_state(user.pk))
+
+
+@transaction.atomic
+def create_follow(user: User, author: User) -> bool:
+    """
+    Создает подписку одним запросом. Возвращает False, если подписка
+    уже существует.
+    """
+    created = links.add(Follow, {'user': user.pk}, 'author', author.pk)
+    if created:
+        _changed(user, author.pk, 1)
+    return created
 
 
-def delete_follow(user: User, author: User) -> Follow:
-    """Удаляет модель подписки."""
-    return Follow.objects.filter(user=user, author=author).delete()
+@transaction.atomic
+def delete_follow(user: User, author_id: int) -> bool:
+    """
+    Удаляет подписку одним запросом. Возвращает False, если подписки
+    не было.
+    """
+    deleted = links.remove(Follow, {'user': user.pk}, 'author', author_id)
+    if deleted:
+        _changed(user, author_id, -1)
+    return deleted
 
 
 def follow_exists(user: User, author: User) -> bool:
     """Возвращает результат проверки на существование подписки."""
     return Follow.objects.filter(user=user, author=author).exists()
+
+
+def get_subscribed_author_ids(user: User, author_ids) -> set:
+    """Возвращает тех из авторов, на кого подписан пользователь."""
+    return set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
@@ -0,0 +1,221 @@
+"""
+Обработка загруженных картинок рецептов вне запроса.
+
+Запрос сохраняет картинку как есть, и рецепт виден сразу. После
+фиксации транзакции картинка в пуле потоков проверяется полным
+декодированием, поворачивается по EXIF, уменьшается до
+RECIPE_IMAGE_MAX_DIMENSION и пересохраняется без метаданных вместе
+с уменьшенными копиями для карточек и BlurHash-заглушкой. Готовые
+файлы подменяют исходный условным UPDATE: если картинку успели
+заменить, результат обработки выбрасывается. Ненужные файлы удаляет
+сборщик мусора (services.media).
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from food.models import Recipe
+from services import blurhash, cache, media
+from services import recipe as rec
+
+logger = logging.getLogger(__name__)
+
+# Расширения файлов по форматам Pillow.
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _get_executor():
+    """Возвращает общий пул обработки и семафор его очереди."""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image')
+            _slots = threading.BoundedSemaphore(
+                settings.RECIPE_IMAGE_QUEUE_SIZE)
+    return _executor, _slots
+
+
+def schedule_processing(recipe: Recipe) -> None:
+    """Ставит картинку рецепта в обработку после фиксации транзакции."""
+    if recipe.image:
+        recipe_id, name = recipe.pk, recipe.image.name
+        transaction.on_commit(lambda: submit(recipe_id, name))
+
+
+def is_current(recipe: Recipe, file) -> bool:
+    """
+    Проверяет, совпадает ли загруженный файл с текущей картинкой
+    рецепта: клиенты часто присылают ту же картинку при каждом
+    изменении рецепта.
+    """
+    field = Recipe.image.field
+    name = field.storage.get_content_name(
+        field.generate_filename(recipe, file.name), file)
+    return name == recipe.image.name
+
+
+def submit(recipe_id: int, name: str) -> None:
+    """
+    Отдает картинку в пул. В синхронном режиме и при переполненной
+    очереди картинка обрабатывается в текущем потоке.
+    """
+    if settings.RECIPE_IMAGE_SYNC:
+        process_image(recipe_id, name)
+        return
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        process_image(recipe_id, name)
+        return
+    future = executor.submit(_process_in_pool, recipe_id, name)
+    future.add_done_callback(lambda future: slots.release())
+
+
+def _process_in_pool(recipe_id: int, name: str) -> None:
+    close_old_connections()
+    try:
+        process_image(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+    finally:
+        close_old_connections()
+
+
+def _encode(image: Image.Image, format: str) -> bytes:
+    output = io.BytesIO()
+    if format == 'PNG':
+        image.convert('RGBA').save(output, format, optimize=True)
+    elif format == 'WEBP':
+        image.save(output, format, quality=settings.RECIPE_IMAGE_QUALITY,
+                   method=6)
+    else:
+        if image.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.convert('RGB').save(output, format, optimize=True,
+                                  progressive=True,
+                                  quality=settings.RECIPE_IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def render(source) -> dict:
+    """
+    Декодирует картинку полностью, поворачивает по EXIF, уменьшает
+    и кодирует заново без метаданных вместе с уменьшенными копиями
+    RECIPE_IMAGE_VARIANTS в WebP и JPEG. Возвращает содержимое файлов
+    по именам вариантов и BlurHash.
+    """
+    max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+    with Image.open(source) as image:
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = (image.mode in ('LA', 'PA')
+                     or 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail((max_dimension, max_dimension))
+    main_format = 'PNG' if image.mode == 'RGBA' else 'JPEG'
+    files = {'': (_encode(image, main_format), FORMATS[main_format])}
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        copy = image.copy()
+        copy.thumbnail((size, size))
+        variants[variant] = {'width': copy.width, 'height': copy.height}
+        for format in ('WEBP', 'JPEG'):
+            files[f'{variant}.{format.lower()}'] = (_encode(copy, format),
+                                                    FORMATS[format])
+    return {'files': files, 'variants': variants,
+            'placeholder': blurhash.encode(image)}
+
+
+def prepare(name: str):
+    """
+    Обрабатывает картинку и сохраняет результат в хранилище.
+    Возвращает имена сохраненных файлов и BlurHash или None, если
+    картинку не удалось декодировать. Не обращается к БД, поэтому
+    может выполняться в отдельном процессе.
+    """
+    storage = Recipe.image.field.storage
+    try:
+        with storage.open(name) as source:
+            result = render(source)
+    except (OSError, Image.DecompressionBombError, SyntaxError) as error:
+        logger.warning('Картинка %s не обработана: %s', name, error)
+        return None
+    stem = os.path.splitext(name)[0]
+    saved = {}
+    for key, (content, ext) in result['files'].items():
+        suffix = f'_{key.split(".")[0]}' if key else ''
+        saved[key] = storage.save(f'{stem}{suffix}.{ext}',
+                                  ContentFile(content))
+    variants = result['variants']
+    for key, saved_name in saved.items():
+        if key:
+            variant, format = key.split('.')
+            variants[variant][format] = saved_name
+    return {'image': saved[''], 'variants': variants,
+            'placeholder': result['placeholder']}
+
+
+def swap(recipe_id: int, name: str, prepared: dict) -> bool:
+    """
+    Подменяет картинку рецепта обработанной, если у рецепта все еще
+    картинка name, и переносит ссылки на файлы. Возвращает True,
+    если картинка подменена.
+    """
+    new_files = media.get_files(prepared['image'], prepared['variants'])
+    with transaction.atomic():
+        old_variants = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=name).values_list(
+            'image_variants', flat=True).first()
+        replaced = old_variants is not None and Recipe.objects.filter(
+            pk=recipe_id, image=name).update(
+            image=prepared['image'],
+            image_variants=prepared['variants'],
+            image_placeholder=prepared['placeholder'])
+        if replaced:
+            media.replace(media.get_files(name, old_variants), new_files)
+            rec.schedule_documents([recipe_id])
+        else:
+            # Файлы без ссылок удалит сборщик мусора.
+            media.acquire(new_files)
+            media.release(new_files)
+    if replaced:
+        cache.bump_generation(cache.RECIPES)
+    return bool(replaced)
+
+
+def process_image(recipe_id: int, name: str) -> bool:
+    """
+    Обрабатывает картинку рецепта и подменяет ее, если у рецепта
+    все еще та же картинка. Возвращает True, если картинка подменена.
+    """
+    prepared = prepare(name)
+    return prepared is not None and swap(recipe_id, name, prepared)
+
+
+def get_urls(variants: dict, request=None) -> dict:
+    """Возвращает уменьшенные копии картинки со ссылками вместо имен."""
+    storage = Recipe.image.field.storage
+    result = {}
+    for variant, values in variants.items():
+        result[variant] = {}
+        for key, value in values.items():
+            if key in media.VARIANT_FORMATS:
+                value = storage.url(value)
+                if request is not None:
+                    value = request.build_absolute_uri(value)
+            result[variant][key] = value
+    return result
@@ -1,6 +1,6 @@
-from django.db.models import Sum
-
 from food.models import Ingredient, IngredientForRecipe
+from services import links
+from services import shopping_cart as sc
 from users.models import User
 
 
@@ -9,15 +9,64 @@ def get_all_ingredients() -> Ingredient:
     return Ingredient.objects.all()
 
 
+def get_existing_ids(ingredient_ids) -> set:
+    """Возвращает id существующих ингредиентов из переданных одним запросом."""
+    return set(Ingredient.objects.filter(pk__in=ingredient_ids).values_list(
+        'pk', flat=True))
+
+
 def get_sum_amount(user: User):
-    """Возвращает сумму всех продуктов."""
-    amount = IngredientForRecipe.objects.filter(
-            recipe__shoppingcart__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-    return amount
+    """
+    Возвращает сумму всех продуктов, отсортированную по названию
+    и единице измерения.
+    """
+    return sc.get_totals(user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'total_amount'
+    )
+
+
+def update_ingredients_amount(ingredients, recipe) -> dict:
+    """
+    Приводит ингредиенты рецепта к новому списку минимальным набором
+    запросов: удаляет лишние одним DELETE, меняет количество у оставшихся
+    одним bulk_update и добавляет новые одним bulk_create. Сигналы
+    не вызываются: при изменении вызывающий код передает результат
+    в sc.schedule_totals и вызывает rec.schedule_documents, которая
+    также сбрасывает кэш рецептов. Возвращает изменения сумм списков
+    покупок, пустые, если состав рецепта не изменился.
+    """
+    amounts = {ingredient['id']: ingredient['amount']
+               for ingredient in ingredients}
+    current = {amount.ingredient_id: amount
+               for amount in IngredientForRecipe.objects.filter(
+                   recipe=recipe)}
+    deltas = {}
+    removed = []
+    for ingredient_id, amount in current.items():
+        if ingredient_id not in amounts:
+            removed.append(ingredient_id)
+            deltas[ingredient_id] = (-amount.amount, -1)
+    changed = []
+    for ingredient_id, amount in current.items():
+        new_amount = amounts.get(ingredient_id)
+        if new_amount is not None and new_amount != amount.amount:
+            deltas[ingredient_id] = (new_amount - amount.amount, 0)
+            amount.amount = new_amount
+            changed.append(amount)
+    added = [{'id': ingredient_id, 'amount': amount}
+             for ingredient_id, amount in amounts.items()
+             if ingredient_id not in current]
+    deltas.update((ingredient['id'], (ingredient['amount'], 1))
+                  for ingredient in added)
+    links.remove_many(IngredientForRecipe, {'recipe': recipe.pk},
+                      'ingredient', removed)
+    if changed:
+        IngredientForRecipe.objects.bulk_update(changed, ['amount'])
+    if added:
+        bulk_create_ingredients_amount(added, recipe)
+    return deltas
 
 
 def bulk_create_ingredients_amount(ingredients, recipe):
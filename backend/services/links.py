@@ -0,0 +1,70 @@
+"""
+Связи пользователя с рецептами и авторами (избранное, список покупок,
+подписки) и рецепта с тэгами и ингредиентами, которые меняются одним
+запросом. Повторы отсекает
+уникальное ограничение модели: INSERT ... ON CONFLICT DO NOTHING
+и DELETE возвращают только реально затронутые строки, поэтому
+одновременные запросы не проверяют существование заранее и не падают
+на нарушении ограничения.
+
+Запросы не вызывают сигналов моделей: производные данные обновляет
+вызывающий код.
+"""
+from django.db import connection
+
+
+def _column(model, field: str) -> str:
+    return connection.ops.quote_name(model._meta.get_field(field).column)
+
+
+def _table(model) -> str:
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def add_many(model, values: dict, field: str, ids) -> set:
+    """
+    Создает связи values + {field: id} для каждого id и возвращает
+    id созданных связей; уже существующие пропускаются.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    fields = [*values, field]
+    columns = ', '.join(_column(model, name) for name in fields)
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    params = [param for pk in ids for param in (*values.values(), pk)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_table(model)} ({columns}) '
+            f'VALUES {", ".join([row] * len(ids))} '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {_column(model, field)}',
+            params)
+        return {pk for pk, in cursor.fetchall()}
+
+
+def remove_many(model, values: dict, field: str, ids) -> set:
+    """Удаляет связи values + {field: id} и возвращает id удаленных."""
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    conditions = [f'{_column(model, name)} = %s' for name in values]
+    conditions.append(
+        f'{_column(model, field)} IN ({", ".join(["%s"] * len(ids))})')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {_table(model)} '
+            f'WHERE {" AND ".join(conditions)} '
+            f'RETURNING {_column(model, field)}',
+            [*values.values(), *ids])
+        return {pk for pk, in cursor.fetchall()}
+
+
+def add(model, values: dict, field: str, pk) -> bool:
+    """Создает связь; возвращает False, если она уже существовала."""
+    return bool(add_many(model, values, field, [pk]))
+
+
+def remove(model, values: dict, field: str, pk) -> bool:
+    """Удаляет связь; возвращает False, если ее не было."""
+    return bool(remove_many(model, values, field, [pk]))
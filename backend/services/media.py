@@ -0,0 +1,113 @@
+"""
+Учет ссылок рецептов на файлы картинок.
+
+Картинки хранятся под хэшем содержимого (food.storage), и один файл
+может принадлежать нескольким рецептам. Поэтому файл не удаляется
+вместе с рецептом: у него уменьшается счетчик ссылок, а файлы без
+ссылок дольше MEDIA_GC_GRACE_PERIOD удаляет порциями collect_garbage.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from food.models import MediaFile, Recipe
+
+# Ключи вариантов картинки, в которых хранятся имена файлов.
+VARIANT_FORMATS = ('webp', 'jpeg')
+
+
+def get_files(image: str, variants: dict) -> list:
+    """Возвращает имена всех файлов картинки и ее копий."""
+    files = [image] if image else []
+    return files + [value for variant in variants.values()
+                    for format, value in variant.items()
+                    if format in VARIANT_FORMATS]
+
+
+def get_recipe_files(recipe: Recipe) -> list:
+    """Возвращает имена файлов, на которые ссылается рецепт."""
+    return get_files(recipe.image.name, recipe.image_variants)
+
+
+def get_stored_files(recipe_id: int) -> list:
+    """Возвращает имена файлов, на которые ссылается рецепт в БД."""
+    row = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image', 'image_variants').first()
+    return get_files(*row) if row else []
+
+
+def _by_times(names) -> dict:
+    """Группирует имена по числу повторов."""
+    by_times = defaultdict(list)
+    for name, times in Counter(names).items():
+        by_times[times].append(name)
+    return by_times
+
+
+def acquire(names) -> None:
+    """Добавляет по ссылке на каждый файл names."""
+    names = [name for name in names if name]
+    if not names:
+        return
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in set(names)],
+        ignore_conflicts=True)
+    for times, batch in _by_times(names).items():
+        MediaFile.objects.filter(name__in=batch).update(
+            references=F('references') + times, released_at=None)
+
+
+def release(names) -> None:
+    """
+    Убирает по ссылке на каждый файл names. Файлы без ссылок
+    запоминают время освобождения.
+    """
+    now = timezone.now()
+    for times, batch in _by_times(name for name in names if name).items():
+        MediaFile.objects.filter(name__in=batch).update(
+            references=Greatest(F('references') - times, Value(0)),
+            released_at=Case(When(references__lte=times, then=Value(now)),
+                             default=F('released_at')))
+
+
+def replace(old_names, new_names) -> None:
+    """Переносит ссылки со старых файлов на новые, меняя только разницу."""
+    old_names, new_names = Counter(old_names), Counter(new_names)
+    acquire((new_names - old_names).elements())
+    release((old_names - new_names).elements())
+
+
+def collect_garbage(batch_size: int, grace_period=None) -> int:
+    """
+    Удаляет порциями файлы без ссылок, освобожденные дольше
+    grace_period секунд назад, и возвращает их кол-во. Файл, загруженный
+    заново за это время, остается до следующей сборки.
+    """
+    if grace_period is None:
+        grace_period = settings.MEDIA_GC_GRACE_PERIOD
+    storage = Recipe.image.field.storage
+    cutoff = timezone.now() - timedelta(seconds=grace_period)
+    files = MediaFile.objects.filter(references=0, released_at__lt=cutoff)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            rows = list(files.select_for_update(skip_locked=True).order_by(
+                'pk').values_list('pk', 'name')[:batch_size])
+            if not rows:
+                return deleted
+            removed, kept = [], []
+            for pk, name in rows:
+                if storage.modified_after(name, cutoff):
+                    kept.append(pk)
+                else:
+                    storage.delete(name)
+                    removed.append(pk)
+            MediaFile.objects.filter(pk__in=removed).delete()
+            MediaFile.objects.filter(pk__in=kept).update(
+                released_at=timezone.now())
+        deleted += len(removed)
@@ -1,17 +1,82 @@
-from food.models import Recipe
+from django.db import transaction
+
+from food.models import Favorite, Recipe, ShoppingCart
+from services import cache, counters, links
+from services import shopping_cart as sc
 from users.models import User
 
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@transaction.atomic
+def create(user: User, recipe: Recipe, model) -> bool:
+    """
+    Добавляет рецепт одним запросом. Возвращает False, если рецепт
+    уже добавлен.
+    """
+    created = links.add(model, {'user': user.pk}, 'recipe', recipe.pk)
+    if created:
+        _changed(user, model, [recipe.pk], 1)
+    return created
+
+
+@transaction.atomic
+def delete(user: User, recipe_id: int, model) -> bool:
+    """
+    Удаляет рецепт одним запросом. Возвращает False, если рецепт
+    не был добавлен.
+    """
+    deleted = links.remove(model, {'user': user.pk}, 'recipe', recipe_id)
+    if deleted:
+        _changed(user, model, [recipe_id], -1)
+    return deleted
+
 
-def is_exists(user: User, recipe: Recipe, model):
-    """Возвращает результат проверки на существование в БД."""
-    return model.objects.filter(user=user, recipe=recipe).exists()
+def _changed(user: User, model, recipe_ids, delta: int) -> None:
+    """
+    Обновляет производные данные после изменения: запросы links
+    не вызывают сигналов.
+    """
+    if not recipe_ids:
+        return
+    counters.change(Recipe, COUNTER_FIELDS[model], recipe_ids, delta)
+    if model is ShoppingCart:
+        if delta > 0:
+            sc.add_to_totals(user.pk, recipe_ids)
+        else:
+            sc.remove_from_totals(user.pk, recipe_ids)
+    cache.bump_on_commit(cache.user_state(user.pk))
 
 
-def create(user: User, recipe: Recipe, model):
-    """Создает модель объекта"""
-    return model.objects.create(user=user, recipe=recipe)
+@transaction.atomic
+def bulk_create(user: User, recipe_ids, model):
+    """
+    Добавляет рецепты одним запросом. Возвращает множества добавленных,
+    уже добавленных ранее и несуществующих рецептов.
+    """
+    recipe_ids = set(recipe_ids)
+    found = set(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+        'pk', flat=True))
+    added = links.add_many(model, {'user': user.pk}, 'recipe', found)
+    _changed(user, model, added, 1)
+    return added, found - added, recipe_ids - found
 
 
-def delete(user: User, recipe: Recipe, model):
-    """Удаляет модель объекта."""
-    return model.objects.filter(user=user, recipe=recipe).delete()
+@transaction.atomic
+def bulk_delete(user: User, recipe_ids, model):
+    """
+    Удаляет рецепты одним запросом. Возвращает множества удаленных,
+    не добавленных и несуществующих рецептов.
+    """
+    recipe_ids = set(recipe_ids)
+    removed = links.remove_many(model, {'user': user.pk}, 'recipe',
+                                recipe_ids)
+    missing = recipe_ids - removed
+    if missing:
+        missing -= set(Recipe.objects.filter(pk__in=missing).values_list(
+            'pk', flat=True))
+    _changed(user, model, removed, -1)
+    return removed, recipe_ids - removed - missing, missing
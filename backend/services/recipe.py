@@ -1,10 +1,23 @@
-from food.models import Recipe
-from users.models import User
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 
+from django.db.models import (Exists, F, OuterRef, Prefetch, QuerySet, Value,
+                              Window)
+from django.db.models.functions import RowNumber
 
-def get_count_recipe_filtering_author(author: User) -> Recipe:
-    """Возвращает кол-во рецептов, отфильтровав по автору."""
-    return Recipe.objects.filter(author=author).count()
+from food.models import (Favorite, IngredientForRecipe, Recipe,
+                         RecipeDocument, ShoppingCart, Tag)
+from services import cache, links
+from services.tag import MASK_BITS
+from users.models import Follow, User
+
+_deferred = threading.local()
+
+
+def get_count_recipe_filtering_author(author: User) -> int:
+    """Возвращает кол-во рецептов автора из его счетчика."""
+    return author.recipes_count
 
 
 def filter_by_author(author: User) -> Recipe:
@@ -12,6 +25,27 @@ def filter_by_author(author: User) -> Recipe:
     return Recipe.objects.filter(author=author)
 
 
+def get_recipes_by_authors(author_ids, limit=None) -> dict:
+    """
+    Возвращает словарь автор -> его последние рецепты, не больше limit
+    на автора. Рецепты всех авторов достаются одним запросом с нумерацией
+    строк внутри каждого автора.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids).only(
+        'id', 'author_id', 'name', 'image', 'image_variants',
+        'image_placeholder', 'cooking_time')
+    if limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('id').desc(),
+        )).filter(row_number__lte=limit)
+    by_author = defaultdict(list)
+    for recipe in recipes.order_by('author_id', '-id'):
+        by_author[recipe.author_id].append(recipe)
+    return by_author
+
+
 def create_recipe(data) -> Recipe:
     """Создает рецепт."""
     return Recipe.objects.create(**data)
@@ -20,3 +54,145 @@ def create_recipe(data) -> Recipe:
 def get_all_recipes() -> Recipe:
     """Возвращает все рецепты."""
     return Recipe.objects.all()
+
+
+def get_recipes_for_read(user: User) -> Recipe:
+    """
+    Возвращает рецепты для чтения: готовое представление рецепта
+    и флаги пользователя достаются одним запросом.
+    """
+    queryset = Recipe.objects.select_related(
+        'author', 'document').defer('search_vector')
+    if user.is_anonymous:
+        return queryset.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False),
+                                 is_subscribed=Value(False))
+    return queryset.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_subscribed=Exists(Follow.objects.filter(
+            user=user, author=OuterRef('author'))),
+    )
+
+
+def update_tags_masks(recipe_ids) -> None:
+    """Пересчитывает маски тэгов рецептов по связям с тэгами."""
+    masks = dict.fromkeys(recipe_ids, 0)
+    if not masks:
+        return
+    relations = Recipe.tags.through.objects.filter(
+        recipe_id__in=masks, tag_id__lte=MASK_BITS
+    ).values_list('recipe_id', 'tag_id')
+    for recipe_id, tag_id in relations:
+        masks[recipe_id] |= 1 << (tag_id - 1)
+    recipes_by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        recipes_by_mask[mask].append(recipe_id)
+    for mask, ids in recipes_by_mask.items():
+        Recipe.objects.filter(pk__in=ids).update(tags_mask=mask)
+
+
+def set_tags(recipe: Recipe, tag_ids) -> bool:
+    """
+    Приводит тэги рецепта к новому набору: читает текущие связи
+    и пишет только разницу - удаляет лишние и добавляет недостающие.
+    m2m_changed не вызывается: при изменении вызывающий код обновляет
+    маску тэгов и вызывает schedule_documents, которая также сбрасывает
+    кэш рецептов. Возвращает True, если тэги изменились.
+    """
+    through = Recipe.tags.through
+    current = set(through.objects.filter(recipe=recipe).values_list(
+        'tag_id', flat=True))
+    tag_ids = set(tag_ids)
+    removed = links.remove_many(through, {'recipe': recipe.pk}, 'tag',
+                                current - tag_ids)
+    added = links.add_many(through, {'recipe': recipe.pk}, 'tag',
+                           tag_ids - current)
+    return bool(removed or added)
+
+
+def build_document(recipe: Recipe) -> dict:
+    """
+    Возвращает представление рецепта без флагов пользователя.
+    Тэги и ингредиенты рецепта должны быть предзагружены.
+    """
+    author = recipe.author
+    return {
+        'id': recipe.id,
+        'tags': [{'id': tag.id,
+                  'name': tag.name,
+                  'color': tag.color,
+                  'slug': tag.slug} for tag in recipe.tags.all()],
+        'author': {'email': author.email,
+                   'id': author.id,
+                   'username': author.username,
+                   'first_name': author.first_name,
+                   'last_name': author.last_name},
+        'ingredients': [{'id': amount.ingredient.id,
+                         'name': amount.ingredient.name,
+                         'measurement_unit':
+                             amount.ingredient.measurement_unit,
+                         'amount': amount.amount}
+                        for amount in recipe.ingredientforrecipe_set.all()],
+        'name': recipe.name,
+        'image': recipe.image.url if recipe.image else None,
+        'image_variants': recipe.image_variants,
+        'image_placeholder': recipe.image_placeholder,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def rebuild_documents(recipes: QuerySet) -> int:
+    """Пересобирает представления рецептов, возвращает их кол-во."""
+    recipes = recipes.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch('ingredientforrecipe_set',
+                 queryset=IngredientForRecipe.objects.select_related(
+                     'ingredient').order_by('id'))
+    )
+    documents = [RecipeDocument(recipe=recipe, data=build_document(recipe))
+                 for recipe in recipes]
+    RecipeDocument.objects.bulk_create(documents,
+                                       update_conflicts=True,
+                                       unique_fields=['recipe'],
+                                       update_fields=['data'])
+    return len(documents)
+
+
+def schedule_documents(recipe_ids) -> None:
+    """
+    Пересобирает представления рецептов и после фиксации транзакции
+    делает устаревшими закэшированные ответы о рецептах. Изменения без
+    сигналов (set_tags, ingr.update_ingredients_amount) должны
+    заканчиваться вызовом этой функции. Внутри deferred_documents
+    пересборка откладывается до выхода из блока.
+    """
+    recipe_ids = set(recipe_ids)
+    if recipe_ids:
+        cache.bump_on_commit(cache.RECIPES)
+    pending = getattr(_deferred, 'recipe_ids', None)
+    if pending is not None:
+        pending.update(recipe_ids)
+    elif recipe_ids:
+        rebuild_documents(Recipe.objects.filter(pk__in=recipe_ids))
+
+
+@contextmanager
+def deferred_documents():
+    """
+    Собирает запросы на пересборку представлений и выполняет их
+    один раз при выходе из блока.
+    """
+    if getattr(_deferred, 'recipe_ids', None) is not None:
+        yield
+        return
+    _deferred.recipe_ids = set()
+    try:
+        yield
+        recipe_ids = _deferred.recipe_ids
+    finally:
+        _deferred.recipe_ids = None
+    schedule_documents(recipe_ids)
@@ -0,0 +1,105 @@
+import re
+from html import escape
+
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, SearchVector)
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.db.models.expressions import RawSQL
+
+from food.models import Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'food_recipe_fts'
+# Базы размечают совпадения служебными символами, а не тэгами: текст
+# рецепта экранируется, и тэги <mark> подставляются уже после этого.
+HEADLINE_START = '\x02'
+HEADLINE_STOP = '\x03'
+TOKEN = re.compile(r'\w+')
+
+
+def get_search_vector() -> SearchVector:
+    """Возвращает выражение поискового вектора рецепта."""
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_index(recipe_ids) -> None:
+    """Обновляет поисковый индекс рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM food_recipe '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids)
+
+
+def delete_from_search_index(recipe_ids) -> None:
+    """Удаляет рецепты из поискового индекса SQLite."""
+    recipe_ids = list(recipe_ids)
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids)
+
+
+def search(queryset: QuerySet, value: str) -> QuerySet:
+    """
+    Возвращает найденные рецепты, упорядоченные по релевантности,
+    с аннотациями search_rank и search_headline.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_headline=SearchHeadline(
+                'text', query, config=SEARCH_CONFIG,
+                start_sel=HEADLINE_START, stop_sel=HEADLINE_STOP),
+        ).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        return _search_fts5(queryset, value)
+    return queryset.filter(name__icontains=value)
+
+
+def _search_fts5(queryset: QuerySet, value: str) -> QuerySet:
+    """Поиск через таблицу FTS5 для локальной разработки и тестов."""
+    tokens = TOKEN.findall(value)
+    if not tokens:
+        return queryset.none()
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    matched = (f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+               f'AND {FTS_TABLE}.rowid = food_recipe.id')
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} '
+                      f'WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        search_rank=RawSQL(f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) {matched}',
+                           [match]),
+        search_headline=RawSQL(
+            f"SELECT snippet({FTS_TABLE}, 1, %s, %s, '…', 16) {matched}",
+            [HEADLINE_START, HEADLINE_STOP, match]),
+    ).order_by('-search_rank', '-id')
+
+
+def highlight(headline: str) -> str:
+    """
+    Возвращает фрагмент текста рецепта в виде безопасного HTML,
+    где совпадения выделены тэгом <mark>.
+    """
+    return escape(headline).replace(HEADLINE_START, '<mark>').replace(
+        HEADLINE_STOP, '</mark>')
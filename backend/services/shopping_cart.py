@@ -1,7 +1,202 @@
-from food.models import Recipe, ShoppingCart
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import (BigIntegerField, Case, Count, Exists, F,
+                              OuterRef, Sum, Value, When)
+
+from food.models import (IngredientForRecipe, Recipe, ShoppingCart,
+                         ShoppingCartTotal)
 from users.models import User
 
+_deferred = threading.local()
+
 
 def is_shopping_cart_exists(recipe: Recipe, user=User) -> bool:
     """Возвращает результат проверки на существование в избранном."""
     return ShoppingCart.objects.filter(recipe=recipe, user=user).exists()
+
+
+def get_totals(user: User):
+    """Возвращает суммы ингредиентов из списка покупок пользователя."""
+    return ShoppingCartTotal.objects.filter(user=user).order_by(
+        'ingredient__name', 'ingredient__measurement_unit')
+
+
+def compute_totals(user_ids):
+    """Считает суммы ингредиентов заново по рецептам в списках покупок."""
+    return IngredientForRecipe.objects.filter(
+        recipe__shoppingcart__user_id__in=user_ids
+    ).values(
+        'recipe__shoppingcart__user_id', 'ingredient_id'
+    ).annotate(
+        total=Sum('amount'), recipes=Count('recipe_id')
+    ).order_by()
+
+
+def _lock_users(user_ids) -> list:
+    """
+    Блокирует пользователей одним запросом в порядке id, чтобы их суммы
+    менялись по очереди. Возвращает id заблокированных.
+    """
+    return list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _update_totals(totals, deltas) -> None:
+    """
+    Прибавляет к суммам изменения deltas: {id ингредиента:
+    (изменение количества, изменение кол-ва рецептов)}.
+    """
+    totals.filter(ingredient_id__in=deltas).update(
+        total_amount=F('total_amount') + Case(*(
+            When(ingredient_id=pk, then=Value(total))
+            for pk, (total, _) in deltas.items()),
+            output_field=BigIntegerField()),
+        recipe_count=F('recipe_count') + Case(*(
+            When(ingredient_id=pk, then=Value(recipes))
+            for pk, (_, recipes) in deltas.items()),
+            output_field=BigIntegerField()))
+
+
+def _change_totals(user_id, recipe_ids, sign) -> None:
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов."""
+    deltas = {
+        row['ingredient_id']: (sign * row['total'], sign * row['recipes'])
+        for row in IngredientForRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').annotate(
+            total=Sum('amount'), recipes=Count('recipe_id')
+        ).order_by()
+    }
+    if not deltas:
+        return
+    _lock_users([user_id])
+    totals = ShoppingCartTotal.objects.filter(user_id=user_id)
+    existing = set(totals.filter(ingredient_id__in=deltas).values_list(
+        'ingredient_id', flat=True))
+    if existing:
+        _update_totals(totals, {pk: deltas[pk] for pk in existing})
+    if sign > 0:
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(user_id=user_id, ingredient_id=pk,
+                              total_amount=total, recipe_count=recipes)
+            for pk, (total, recipes) in deltas.items()
+            if pk not in existing)
+    else:
+        totals.filter(recipe_count__lte=0).delete()
+
+
+def change_recipe_totals(recipe_id, deltas) -> None:
+    """
+    Применяет изменения ингредиентов рецепта deltas к суммам всех
+    пользователей, у которых он в списке покупок. Кол-во запросов
+    не зависит от кол-ва пользователей: суммы меняются одним UPDATE,
+    недостающие добавляются одним INSERT ... SELECT, обнулившиеся
+    удаляются одним DELETE.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    users = ShoppingCart.objects.filter(recipe_id=recipe_id).values('user_id')
+    if not _lock_users(users):
+        return
+    totals = ShoppingCartTotal.objects.filter(user_id__in=users)
+    _update_totals(totals, deltas)
+    added = [pk for pk, (_, recipes) in deltas.items() if recipes > 0]
+    if added:
+        missing = IngredientForRecipe.objects.filter(
+            recipe_id=recipe_id, ingredient_id__in=added,
+            recipe__shoppingcart__isnull=False
+        ).exclude(Exists(ShoppingCartTotal.objects.filter(
+            user_id=OuterRef('recipe__shoppingcart__user_id'),
+            ingredient_id=OuterRef('ingredient_id')))
+        ).values(
+            'recipe__shoppingcart__user_id', 'ingredient_id'
+        ).annotate(
+            total=Sum('amount'), recipes=Count('recipe_id')
+        ).order_by()
+        sql, params = missing.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ShoppingCartTotal._meta.db_table} '
+                f'(user_id, ingredient_id, total_amount, recipe_count) '
+                f'{sql}', params)
+    if any(recipes < 0 for _, recipes in deltas.values()):
+        totals.filter(ingredient_id__in=deltas,
+                      recipe_count__lte=0).delete()
+
+
+def get_recipe_deltas(recipe_id, sign=1) -> dict:
+    """Возвращает ингредиенты рецепта в виде изменений сумм."""
+    deltas = {}
+    for ingredient_id, amount in IngredientForRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', 'amount'):
+        total, recipes = deltas.get(ingredient_id, (0, 0))
+        deltas[ingredient_id] = (total + sign * amount, recipes + sign)
+    return deltas
+
+
+def merge_deltas(target: dict, deltas: dict) -> dict:
+    """Складывает изменения сумм deltas в target."""
+    for pk, (total, recipes) in deltas.items():
+        old_total, old_recipes = target.get(pk, (0, 0))
+        target[pk] = (old_total + total, old_recipes + recipes)
+    return target
+
+
+def add_to_totals(user_id, recipe_ids) -> None:
+    """Прибавляет ингредиенты добавленных в список покупок рецептов."""
+    _change_totals(user_id, recipe_ids, 1)
+
+
+def remove_from_totals(user_id, recipe_ids) -> None:
+    """Вычитает ингредиенты убранных из списка покупок рецептов."""
+    _change_totals(user_id, recipe_ids, -1)
+
+
+def rebuild_totals(user_ids) -> None:
+    """Пересчитывает суммы пользователей заново."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    _lock_users(user_ids)
+    ShoppingCartTotal.objects.filter(user_id__in=user_ids).delete()
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(user_id=row['recipe__shoppingcart__user_id'],
+                          ingredient_id=row['ingredient_id'],
+                          total_amount=row['total'],
+                          recipe_count=row['recipes'])
+        for row in compute_totals(user_ids).iterator())
+
+
+def schedule_totals(recipe_id, deltas) -> None:
+    """
+    Применяет изменения ингредиентов рецепта к суммам списков покупок.
+    Внутри deferred_totals изменения копятся и применяются по разу
+    на рецепт при выходе из блока.
+    """
+    pending = getattr(_deferred, 'deltas', None)
+    if pending is not None:
+        merge_deltas(pending.setdefault(recipe_id, {}), deltas)
+    else:
+        change_recipe_totals(recipe_id, deltas)
+
+
+@contextmanager
+def deferred_totals():
+    """
+    Собирает изменения сумм и применяет их один раз при выходе
+    из блока.
+    """
+    if getattr(_deferred, 'deltas', None) is not None:
+        yield
+        return
+    _deferred.deltas = {}
+    try:
+        yield
+        pending = _deferred.deltas
+    finally:
+        _deferred.deltas = None
+    for recipe_id, deltas in pending.items():
+        change_recipe_totals(recipe_id, deltas)
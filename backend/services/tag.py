@@ -1,6 +1,62 @@
 from food.models import Tag
 
+# Бит тэга в маске рецепта - id - 1, знаковый бит BigIntegerField не занят.
+MASK_BITS = 63
+# Наибольшее кол-во масок в условии tags_mask IN (...).
+MAX_MATCHING_MASKS = 1024
+
 
 def get_all_tags() -> Tag:
     """Возвращает все существующие тэги."""
     return Tag.objects.all()
+
+
+def get_existing_ids(tag_ids) -> set:
+    """Возвращает id существующих тэгов из переданных одним запросом."""
+    return set(Tag.objects.filter(pk__in=tag_ids).values_list(
+        'pk', flat=True))
+
+
+def get_mask(tag_ids) -> int:
+    """
+    Возвращает битовую маску тэгов или None, если id какого-то
+    тэга не помещается в маску.
+    """
+    mask = 0
+    for tag_id in tag_ids:
+        if not 0 < tag_id <= MASK_BITS:
+            return None
+        mask |= 1 << (tag_id - 1)
+    return mask
+
+
+def get_submasks(mask: int):
+    """Перебирает все подмножества битов маски, включая пустое."""
+    submask = mask
+    while True:
+        yield submask
+        if not submask:
+            return
+        submask = (submask - 1) & mask
+
+
+def get_matching_masks(mask: int, match_all: bool) -> list:
+    """
+    Возвращает все маски из существующих тэгов, в которых есть все
+    (match_all) или хотя бы один из тэгов mask. По такому списку
+    условие tags_mask IN (...) читает индекс, а побитовое И - нет.
+    Возвращает None, если масок больше MAX_MATCHING_MASKS.
+    """
+    existing = get_mask(get_all_tags().filter(
+        pk__lte=MASK_BITS).values_list('pk', flat=True))
+    rest = existing & ~mask
+    count = 2 ** bin(rest).count('1')
+    if not match_all:
+        count = 2 ** bin(existing).count('1') - count
+    if count > MAX_MATCHING_MASKS:
+        return None
+    if match_all:
+        return [mask | submask for submask in get_submasks(rest)]
+    return [selected | submask
+            for selected in get_submasks(mask & existing) if selected
+            for submask in get_submasks(rest)]
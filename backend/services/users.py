@@ -1,3 +1,5 @@
+from django.db.models import Value
+
 from users.models import User
 
 
@@ -8,4 +10,5 @@ def get_all_users() -> User:
 
 def get_user_sucribers(value: User) -> User:
     """Возвращает список пользователей, на которых он подписан."""
-    return User.objects.filter(subscriber__user=value)
+    return User.objects.filter(subscriber__user=value).annotate(
+        is_subscribed=Value(True))
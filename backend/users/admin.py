@@ -6,4 +6,6 @@ from .models import User
 
 @admin.register(User)
 class UserAdmin(DjangoUserAdmin):
+    list_display = ["username", "email", "first_name", "last_name",
+                    "recipes_count", "followers_count"]
     list_filter = ["email", "username"]
@@ -5,7 +5,26 @@ from django.core.validators import RegexValidator
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """
+    Модель со счетчиками, которые меняет services.counters атомарными
+    выражениями F(). Сохранение существующего объекта не пишет
+    счетчики: в памяти они могли устареть, и запись затерла бы
+    изменения, сделанные после чтения объекта.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not (self._state.adding or args or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     username = models.CharField(
         "Псевдоним",
         max_length=150,
@@ -24,6 +43,16 @@ class User(AbstractUser):
         "Электронная почта",
         max_length=254,
         unique=True)
+    recipes_count = models.PositiveIntegerField(
+        "Кол-во рецептов",
+        default=0,
+        editable=False)
+    followers_count = models.PositiveIntegerField(
+        "Кол-во подписчиков",
+        default=0,
+        editable=False)
+
+    counter_fields = ("recipes_count", "followers_count")
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
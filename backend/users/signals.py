@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from services import cache, counters
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(instance, **kwargs):
+    """Делает устаревшими закэшированные данные подписчика."""
+    cache.bump_on_commit(cache.user_state(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_counted(instance, signal, created=False, **kwargs):
+    """Меняет счетчик подписчиков автора."""
+    delta = counters.get_delta(signal, created)
+    if delta:
+        counters.change(User, 'followers_count', [instance.author_id], delta)
@@ -4,7 +4,7 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotAuthenticated
+from rest_framework.exceptions import NotAuthenticated, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -12,7 +12,9 @@ from rest_framework.views import APIView
 from api.pagination import CustomPagination
 from api.serializers import (CustomAuthTokenEmailSerializer,
                              CustomUserSerializer, FollowSerializer)
-from services import follow, users
+from services import follow
+from services import recipe as rec
+from services import users
 from users.models import User
 
 
@@ -43,21 +45,32 @@ class CustomUserViewSet(UserViewSet):
     queryset = users.get_all_users()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPagination
+    lookup_value_regex = r'\d+'
 
     @action(detail=True,
             methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id):
         user = request.user
-        author = get_object_or_404(User, id=id)
 
         if request.method == 'POST':
-            serializer = self._validate_data(author, request)
-            follow.create_follow(user, author)
+            author = get_object_or_404(User, id=id)
+            if user.id == author.id:
+                return Response({'errors': 'Подписка на себя - запрещена.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if not follow.create_follow(user, author):
+                return Response(
+                    {'errors': 'Вы уже подписаны на данного пользователя.'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            context = {"request": request,
+                       "recipes_limit": self._get_recipes_limit(request)}
+            serializer = FollowSerializer(author, context=context)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        serializer = self._validate_data(author, request)
-        follow.delete_follow(user, author)
+        if not follow.delete_follow(user, int(id)):
+            get_object_or_404(User, id=id)
+            return Response({'errors': 'Вы не подписаны.'},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False,
@@ -66,15 +79,22 @@ class CustomUserViewSet(UserViewSet):
         user = request.user
         queryset = users.get_user_sucribers(user)
         pages = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(pages,
-                                      many=True,
-                                      context={'request': request})
+        limit = self._get_recipes_limit(request)
+        context = {
+            'request': request,
+            'recipes_limit': limit,
+            'recipes_by_author': rec.get_recipes_by_authors(
+                [author.pk for author in pages], limit),
+        }
+        serializer = FollowSerializer(pages, many=True, context=context)
         return self.get_paginated_response(serializer.data)
 
-    def _validate_data(self, author: User, request) -> FollowSerializer:
-        """Возвращает результат работы сериализера."""
-        serializer = FollowSerializer(author,
-                                      data=request.data,
-                                      context={"request": request})
-        serializer.is_valid(raise_exception=True)
-        return serializer
+    def _get_recipes_limit(self, request):
+        """Возвращает кол-во рецептов на автора из ?recipes_limit=."""
+        limit = request.query_params.get('recipes_limit')
+        if limit is None:
+            return None
+        if not limit.isdigit():
+            raise ValidationError({
+                'recipes_limit': 'Укажите целое неотрицательное число.'})
+        return int(limit)